@@ -0,0 +1,223 @@
+import argparse
+import csv
+import json
+import sys
+import time
+from datetime import datetime, timezone
+import numpy as np
+import strategy
+from indicators import IndicatorEngine
+from scheduler import SIGNAL_BAR, TREND_BAR
+
+SEARCH_CHUNK = 512
+DEFAULT_TRADE_SIZE = 500
+
+# Candle Loading
+def load_candles(path):
+    # .npz with ts/open/high/low/close arrays, a CSV with those headers, or a saved OKX candles payload
+    if path.endswith(".npz"):
+        data = np.load(path)
+        return {key: data[key] for key in ("ts", "open", "high", "low", "close")}
+    if path.endswith(".csv"):
+        with open(path, newline="") as f:
+            rows = list(csv.DictReader(f))
+        return candles_from_rows([[row["ts"], row["open"], row["high"], row["low"], row["close"]] for row in rows])
+    with open(path) as f:
+        payload = json.load(f)
+    return candles_from_rows(payload["data"] if isinstance(payload, dict) else payload)
+
+def load_store_candles(inst_id, bar, days=None):
+    # Memory-mapped history from the local candle store (fill it with `python candle_store.py backfill`)
+    from candle_store import CandleStore
+    start = int((time.time() - days * 86400) * 1000) if days else None
+    return CandleStore().load(inst_id, bar, start)
+
+def candles_from_rows(rows):
+    # OKX rows come newest first; only confirmed candles are backtested
+    rows = sorted((row for row in rows if len(row) < 9 or row[8] == '1'), key=lambda row: int(row[0]))
+    ts = np.array([int(row[0]) for row in rows], dtype=np.int64)
+    prices = np.array([row[1:5] for row in rows], dtype=np.float64).reshape(-1, 4)
+    return {"ts": ts, "open": prices[:, 0], "high": prices[:, 1], "low": prices[:, 2], "close": prices[:, 3]}
+
+def compute_indicators(candles, ema_periods, atr_window=strategy.atr_period):
+    # Same incremental engine as live trading, so backtest and live signals agree exactly
+    engine = IndicatorEngine(ema_periods, atr_window)
+    values = np.array([list(engine.update(ts, high, low, close).values())
+                       for ts, high, low, close in zip(candles["ts"].tolist(), candles["high"].tolist(),
+                                                       candles["low"].tolist(), candles["close"].tolist())],
+                      dtype=np.float64).reshape(-1, len(engine.columns))
+    return {name: values[:, i] for i, name in enumerate(engine.columns)}
+
+def trend_bar_filter(candles, bar=SIGNAL_BAR, trend_bar=TREND_BAR, ema_periods=None):
+    # EMA trend of the trend bar as the live scheduler sees it at each candle's close: that of the last
+    # trend-bar candle closed by then, resampled from these candles
+    from candle_store import resample, bar_ms
+    ema_periods = ema_periods or (strategy.ema_short_period, strategy.ema_mid_period, strategy.ema_long_period)
+    n = len(candles["close"])
+    higher = resample({**candles, "vol": candles.get("vol", np.zeros(n))}, trend_bar, bar)
+    indicators = compute_indicators(higher, ema_periods)
+    # Leading 0: no trend-bar candle has closed yet
+    trend = np.concatenate(([0], strategy.ema_trend(*(indicators[f"ema_{period}"] for period in ema_periods))))
+    closed = np.searchsorted(higher["ts"] + bar_ms(trend_bar), candles["ts"] + bar_ms(bar), side="right")
+    return trend[closed]
+
+def signal_trend(indicators, ema_periods):
+    # EMA trend per candle; 0 until the ATR has warmed up
+    trend = strategy.ema_trend(*(indicators[f"ema_{period}"] for period in ema_periods))
+    return np.where(indicators["atr"] > 0, trend, 0)
+
+# Backtest
+def run_backtest(candles, trade_size=DEFAULT_TRADE_SIZE, ema_periods=None, stop_loss=None, trailing_factor=None,
+                 profit_cut=0.0, indicators=None, trend_filter=None, previous_trend=0):
+    # trend_filter: trend_bar_filter() output; entries then also need the trend bar stacked the same way,
+    # as SignalScheduler requires live. previous_trend: signal_trend() of the candle before these (a window
+    # cut from a longer series), so its first candle is not taken for a fresh crossover
+    ema_periods = ema_periods or (strategy.ema_short_period, strategy.ema_mid_period, strategy.ema_long_period)
+    stop_loss = strategy.stop_loss_pct if stop_loss is None else stop_loss
+    trailing_factor = strategy.trailing_stop_factor if trailing_factor is None else trailing_factor
+    indicators = indicators or compute_indicators(candles, ema_periods)
+    ts, open_, high, low, close = (candles[key] for key in ("ts", "open", "high", "low", "close"))
+    n = len(close)
+    atr = indicators["atr"]
+    trend = signal_trend(indicators, ema_periods)
+    # Entries fire on the candle where the EMAs first stack in a direction
+    previous = np.concatenate(([previous_trend], trend[:-1]))
+    entries = (trend != 0) & (trend != previous)
+    if trend_filter is not None:
+        entries &= trend_filter == trend
+    entries = np.flatnonzero(entries)
+
+    trades = []
+    realized = np.zeros(n)
+    i = 0
+    next_free = 0
+    while i < len(entries):
+        entry = entries[i]
+        if entry < next_free or entry >= n - 1:
+            i += 1
+            continue
+        direction = int(trend[entry])
+        entry_price = close[entry]
+        entry_atr = atr[entry]
+        size = strategy.order_size(trade_size, entry_price)
+        fixed_stop = strategy.stop_price(entry_price, direction, stop_loss)
+        exit_index, exit_price, exit_type = _find_exit(entry, direction, entry_price, entry_atr, fixed_stop, trailing_factor,
+                                                       open_, high, low, close)
+        pnl = strategy.trade_pnl(entry_price, exit_price, size, direction) * (1 - profit_cut)
+        realized[exit_index] += pnl
+        trades.append({
+            "entry_time": _format_ts(ts[entry]),
+            "exit_time": _format_ts(ts[exit_index]),
+            "side": "long" if direction == 1 else "short",
+            "entry_price": float(entry_price),
+            "exit_price": float(exit_price),
+            "size_sol": size,
+            "exit_type": exit_type,
+            "pnl": float(pnl),
+        })
+        next_free = exit_index + 1
+        i += 1
+    return trades, np.cumsum(realized)
+
+def _find_exit(entry, direction, entry_price, entry_atr, fixed_stop, trailing_factor, open_, high, low, close):
+    # Only the exits PositionMonitor applies live: the fixed stop and the ATR trailing stop (a trend flip
+    # does not close a live position, and custom TPs are per user)
+    n = len(close)
+    # Trailing extreme uses candles strictly before the one being tested (no lookahead)
+    extreme = entry_price
+    start = entry + 1
+    while start < n:
+        end = min(n, start + SEARCH_CHUNK)
+        favourable = high[start:end] if direction == 1 else low[start:end]
+        adverse = low[start:end] if direction == 1 else high[start:end]
+        if direction == 1:
+            running = np.maximum.accumulate(np.concatenate(([extreme], favourable[:-1])))
+            stops = np.maximum(fixed_stop, strategy.trailing_stop_price(running, entry_atr, 1, trailing_factor))
+            hit = adverse <= stops
+        else:
+            running = np.minimum.accumulate(np.concatenate(([extreme], favourable[:-1])))
+            stops = np.minimum(fixed_stop, strategy.trailing_stop_price(running, entry_atr, -1, trailing_factor))
+            hit = adverse >= stops
+        exits = np.flatnonzero(hit)
+        if len(exits):
+            k = exits[0]
+            index = start + k
+            # Gapped through the stop: filled at the open
+            gapped = open_[index] < stops[k] if direction == 1 else open_[index] > stops[k]
+            price = open_[index] if gapped else stops[k]
+            trailing = stops[k] != fixed_stop
+            return index, price, "Trailing Stop" if trailing else "Stop Loss"
+        extreme = running[-1]
+        extreme = max(extreme, favourable[-1]) if direction == 1 else min(extreme, favourable[-1])
+        start = end
+    return n - 1, close[n - 1], "End of Data"
+
+def _format_ts(ts):
+    return datetime.fromtimestamp(int(ts) / 1000, tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+def summarize(trades, equity):
+    pnls = np.array([trade["pnl"] for trade in trades])
+    peak = np.maximum.accumulate(np.concatenate(([0.0], equity)))
+    return {
+        "trades": len(trades),
+        "win_rate": float((pnls > 0).mean()) if len(pnls) else 0.0,
+        "total_pnl": float(pnls.sum()),
+        "max_drawdown": float((peak - np.concatenate(([0.0], equity))).max()),
+    }
+
+def top_trades(trades, count=5):
+    top = sorted(trades, key=lambda trade: trade["pnl"], reverse=True)[:count]
+    return [{"entry_time": t["entry_time"], "side": t["side"], "entry_price": round(t["entry_price"], 2),
+             "exit_price": round(t["exit_price"], 2), "pnl": round(t["pnl"], 2)} for t in top]
+
+def check_sample_trades(trades, tolerance=0.01):
+    # Compares regenerated top trades with strategy.SAMPLE_TRADES
+    expected = strategy.SAMPLE_TRADES
+    actual = top_trades(trades, len(expected))
+    mismatches = []
+    for want, got in zip(expected, actual + [None] * (len(expected) - len(actual))):
+        if got is None or want["entry_time"] != got["entry_time"] or want["side"] != got["side"] or any(
+                abs(want[key] - got[key]) > tolerance for key in ("entry_price", "exit_price", "pnl")):
+            mismatches.append((want, got))
+    return mismatches
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest the GoodBoyTrader EMA/ATR strategy")
+    parser.add_argument("candles", nargs="?", help="candles file (.npz, .csv or OKX JSON payload)")
+    parser.add_argument("--inst", help="read candles for this instrument from the local candle store instead")
+    parser.add_argument("--bar", default=SIGNAL_BAR, help="bar of the candles (a candle store bar is resampled from 15m where possible)")
+    parser.add_argument("--trend-bar", default=TREND_BAR,
+                        help="bar whose EMA trend must agree with an entry, resampled from the candles (empty: no filter)")
+    parser.add_argument("--days", type=float, help="candle store history to test, in days (default: all of it)")
+    parser.add_argument("--trade-size", type=float, default=DEFAULT_TRADE_SIZE)
+    parser.add_argument("--profit-cut", type=float, default=0.0)
+    parser.add_argument("--top", type=int, default=5)
+    parser.add_argument("--trades-out", help="write the full trade list as JSON")
+    parser.add_argument("--check", action="store_true", help="exit non-zero if the top trades differ from SAMPLE_TRADES")
+    args = parser.parse_args()
+    if bool(args.candles) == bool(args.inst):
+        parser.error("give either a candles file or --inst")
+
+    if args.inst:
+        candles = load_store_candles(args.inst, args.bar, args.days)
+        if not len(candles["close"]):
+            parser.error(f"no stored {args.bar} candles for {args.inst}; run `python candle_store.py backfill {args.inst}`")
+    else:
+        candles = load_candles(args.candles)
+    start = time.perf_counter()
+    trend_filter = trend_bar_filter(candles, args.bar, args.trend_bar) if args.trend_bar and args.trend_bar != args.bar else None
+    trades, equity = run_backtest(candles, trade_size=args.trade_size, profit_cut=args.profit_cut, trend_filter=trend_filter)
+    elapsed = time.perf_counter() - start
+    print(json.dumps({**summarize(trades, equity), "candles": len(candles["close"]), "seconds": round(elapsed, 3)}))
+    print(json.dumps(top_trades(trades, args.top), indent=4))
+    if args.trades_out:
+        with open(args.trades_out, "w") as f:
+            json.dump(trades, f, indent=2)
+    if args.check:
+        mismatches = check_sample_trades(trades)
+        for want, got in mismatches:
+            print(f"SAMPLE_TRADES mismatch: expected {want}, got {got}", file=sys.stderr)
+        sys.exit(1 if mismatches else 0)
+
+if __name__ == "__main__":
+    main()
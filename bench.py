@@ -0,0 +1,895 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import storage
+import strategy
+import http_client
+import executor
+
+# Legacy data access (connection per call), kept for before/after comparisons
+def legacy_get_user(path, chat_id):
+    conn = sqlite3.connect(path)
+    c = conn.cursor()
+    c.execute("SELECT * FROM users WHERE chat_id = ?", (chat_id,))
+    result = c.fetchone()
+    conn.close()
+    return result or (chat_id,) + storage.DEFAULT_USER
+
+def legacy_update_user(path, chat_id, tier, trade_size):
+    conn = sqlite3.connect(path)
+    c = conn.cursor()
+    profit_cut = 0.05 if tier == "standard" else 0.03 if tier == "elite" else 0
+    signup_date = datetime.now(storage.TIMEZONE).isoformat() if tier == "free" else legacy_get_user(path, chat_id)[5]
+    sub_expiry = legacy_get_user(path, chat_id)[6]
+    current = legacy_get_user(path, chat_id)
+    c.execute(storage.REPLACE_USER,
+              (chat_id, tier, trade_size, current[3] or 0, profit_cut, signup_date, sub_expiry,
+               current[7], current[8], current[9], current[10], current[11], current[12], current[13]))
+    conn.commit()
+    conn.close()
+
+def legacy_record_trade(path, chat_id, total_pnl, trade, user_pnl):
+    conn = sqlite3.connect(path)
+    c = conn.cursor()
+    c.execute(storage.UPDATE_USER_PNL, (total_pnl, chat_id))
+    c.execute(storage.INSERT_TRADE,
+              (chat_id, trade['entry_time'].isoformat(), trade['entry_price'],
+               trade['exit_time'].isoformat(), trade['exit_price'], trade['side'], trade['size_sol'], user_pnl))
+    conn.commit()
+    conn.close()
+
+def sample_trade():
+    now = datetime.now(storage.TIMEZONE)
+    return {"entry_time": now, "exit_time": now, "entry_price": 126.70, "exit_price": 124.40, "side": "short", "size_sol": 2.5}
+
+# Storage benchmark: one trade-close burst (profit cut lookup + pnl/trade write) per user
+def bench_storage(users):
+    trade = sample_trade()
+    chat_ids = [str(7000000000 + i) for i in range(users)]
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = os.path.join(tmp, "legacy.db")
+        storage.DB_PATH = legacy_path
+        storage.init_db()
+        # Legacy init used the default rollback journal
+        sqlite3.connect(legacy_path).execute("PRAGMA journal_mode=DELETE").close()
+        for chat_id in chat_ids:
+            legacy_update_user(legacy_path, chat_id, "standard", 100)
+        start = time.perf_counter()
+        for chat_id in chat_ids:
+            legacy_get_user(legacy_path, chat_id)
+            legacy_record_trade(legacy_path, chat_id, 10.0, trade, 10.0)
+        results["before"] = users / (time.perf_counter() - start)
+
+        storage.DB_PATH = os.path.join(tmp, "storage.db")
+        storage.init_db()
+        for chat_id in chat_ids:
+            storage.update_user(chat_id, "standard", 100)
+        storage.flush()
+        start = time.perf_counter()
+        for chat_id in chat_ids:
+            storage.get_user(chat_id)
+            storage.record_trade(chat_id, 10.0, trade, 10.0)
+        storage.flush()
+        results["after"] = users / (time.perf_counter() - start)
+        storage.close()
+    return results
+
+# Load test: handler latency while the upstream (OKX/Tronscan) is slow
+class SlowUpstream:
+    # Fake HTTP upstream on its own thread and event loop, so blocking clients cannot stall it
+    def __init__(self, delay, body=b'{"code": "0", "data": [], "confirmed": true}'):
+        self.delay = delay
+        self.body = body
+        self.loop = asyncio.new_event_loop()
+        self.ready = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    async def _handle(self, reader, writer):
+        try:
+            await reader.readuntil(b"\r\n\r\n")
+            await asyncio.sleep(self.delay)
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nConnection: close\r\n"
+                         b"Content-Length: %d\r\n\r\n%s" % (len(self.body), self.body))
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.server = self.loop.run_until_complete(asyncio.start_server(self._handle, "127.0.0.1", 0))
+        self.url = f"http://127.0.0.1:{self.server.sockets[0].getsockname()[1]}"
+        self.ready.set()
+        self.loop.run_forever()
+
+    def __enter__(self):
+        self.thread.start()
+        self.ready.wait()
+        return self
+
+    def __exit__(self, *exc):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(5)
+
+async def _handler_latencies(upstream_call, duration, handler_interval=0.01, upstream_interval=0.2):
+    # A handler that does no I/O of its own: any latency is time spent waiting for the event loop
+    latencies = []
+    upstream_tasks = []
+    async def handler(scheduled):
+        await asyncio.sleep(0)
+        latencies.append(time.perf_counter() - scheduled)
+    async def upstream_load():
+        while True:
+            upstream_tasks.append(asyncio.create_task(upstream_call()))
+            await asyncio.sleep(upstream_interval)
+    load = asyncio.create_task(upstream_load())
+    loop = asyncio.get_running_loop()
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        scheduled = time.perf_counter()
+        loop.create_task(handler(scheduled))
+        await asyncio.sleep(handler_interval)
+    load.cancel()
+    await asyncio.gather(*upstream_tasks, return_exceptions=True)
+    latencies.sort()
+    return {"p50_ms": latencies[len(latencies) // 2] * 1000, "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000,
+            "max_ms": latencies[-1] * 1000}
+
+async def _loadtest(base_url, duration):
+    import urllib.request
+    async def blocking_call():
+        # Previous behaviour: a synchronous HTTP call (requests.get) inside the event loop; the stdlib client
+        # blocks the loop the same way without the extra dependency
+        with urllib.request.urlopen(f"{base_url}/api/transaction/abc") as response:
+            json.loads(response.read())
+    async def async_call():
+        await http_client.get_tron_tx("abc", base_url=base_url)
+    results = {"before": await _handler_latencies(blocking_call, duration),
+               "after": await _handler_latencies(async_call, duration)}
+    await http_client.close_http_client()
+    return results
+
+def bench_loadtest(upstream_delay, duration):
+    with SlowUpstream(upstream_delay) as upstream:
+        return asyncio.run(_loadtest(upstream.url, duration))
+
+# Order fan-out: submit-to-ack skew across subscribers against a mock exchange
+async def _fanout(base_url, users):
+    subscribers = [(str(7000000000 + i), 500, f"key{i}", f"secret{i}", "pass") for i in range(users)]
+    engine = executor.ExecutionEngine(base_url=base_url)
+    started = time.perf_counter()
+    for chat_id, trade_size, api_key, api_secret, api_pass in subscribers:
+        # Previous behaviour: one user at a time
+        client = engine.client_for(chat_id, api_key, api_secret, api_pass)
+        await client.place_order(engine.inst_id, executor.TD_MODE, "buy", "market", "1")
+    sequential_ms = (time.perf_counter() - started) * 1000
+    await engine.open_positions(subscribers, "long", 130.0, "bench1")
+    await http_client.close_http_client()
+    return {"before_skew_ms": sequential_ms, "after_skew_ms": engine.last_fanout["skew_ms"],
+            "after_total_ms": engine.last_fanout["total_ms"], **engine.latency_stats()}
+
+def bench_fanout(users, exchange_delay):
+    # Answers both the order and the fill lookup (market orders fill at once)
+    body = b'{"code": "0", "data": [{"ordId": "1", "sCode": "0", "state": "filled", "avgPx": "130.0", "accFillSz": "19"}]}'
+    with SlowUpstream(exchange_delay, body) as exchange:
+        return asyncio.run(_fanout(exchange.url, users))
+
+# Signal scheduler: wall-clock per refresh round as instruments are added, against a slow mock exchange
+async def _scheduler(base_url, counts):
+    import trading
+    from scheduler import SignalScheduler
+    trading.okx_client = http_client.OkxAsyncClient(base_url=base_url)
+    results = {}
+    for count in counts:
+        instruments = [f"BENCH{i}-USDT-SWAP" for i in range(count)]
+        trading.indicator_state.clear()
+        started = time.perf_counter()
+        for inst_id in instruments:
+            # Previous behaviour: one instrument and bar after another
+            for bar in ("4H", "15m"):
+                await trading.refresh_market_data(inst_id, bar)
+        sequential = time.perf_counter() - started
+        trading.indicator_state.clear()
+        scheduler = SignalScheduler(trading.refresh_market_data, instruments)
+        await scheduler.poll()
+        seed = scheduler.last_round["seconds"]
+        cpu = time.process_time()
+        await scheduler.poll()
+        results[count] = {"sequential_s": sequential, "seed_s": seed, "round_s": scheduler.last_round["seconds"],
+                          "round_cpu_s": time.process_time() - cpu}
+    await http_client.close_http_client()
+    return results
+
+def bench_scheduler(counts, upstream_delay):
+    body = json.dumps(synthetic_candles("15m", 400)).encode()
+    with SlowUpstream(upstream_delay, body) as upstream:
+        return asyncio.run(_scheduler(upstream.url, counts))
+
+# WebSocket stream: reconnects and REST backfill against a local fake OKX feed; checks that every confirmed
+# candle reaches subscribers once and in order
+STREAM_CANDLES = 300
+# The fake feed drops the candle connection after this many pushes, and this many candles close before
+# the client is back
+STREAM_DROP_EVERY = 50
+STREAM_OUTAGE = 20
+
+class FakeOkxFeed:
+    # One server for both endpoints: "tickers" subscriptions get a ticker, candle subscriptions get the
+    # confirmed candles (each followed by the next, in-progress one). Like OKX, the last confirmed candle is
+    # pushed again on every subscribe. get_candlesticks is the REST side the stream backfills from
+    def __init__(self, rows, drop_every, outage):
+        self.rows = rows
+        self.drop_every = drop_every
+        self.outage = outage
+        self.closed = 0
+        self.connections = 0
+        self.backfilled = 0
+
+    async def handle(self, ws):
+        import websockets
+        try:
+            await self._serve(ws)
+        except websockets.ConnectionClosed:
+            pass
+
+    async def _serve(self, ws):
+        subscribe = json.loads(await ws.recv())
+        arg = subscribe["args"][0]
+        if arg["channel"] == "tickers":
+            await ws.send(json.dumps({"arg": arg, "data": [{"last": self.rows[0][4]}]}))
+        else:
+            self.connections += 1
+            if self.closed:
+                await ws.send(json.dumps({"arg": arg, "data": [self.rows[self.closed - 1]]}))
+            for _ in range(self.drop_every):
+                if self.closed == len(self.rows):
+                    break
+                self.closed += 1
+                await ws.send(json.dumps({"arg": arg, "data": [self.rows[self.closed - 1]]}))
+                if self.closed < len(self.rows):
+                    await ws.send(json.dumps({"arg": arg, "data": [self.rows[self.closed][:8] + ["0"]]}))
+                await asyncio.sleep(0)
+            else:
+                # Candles keep closing while the client reconnects
+                self.closed = min(len(self.rows), self.closed + self.outage)
+                await ws.close()
+                return
+        async for message in ws:
+            if message == "ping":
+                await ws.send("pong")
+
+    async def get_candlesticks(self, instId, after='', before='', bar='', limit=''):
+        # OKX paging: newest first, at most `limit` rows older than `after` / newer than `before`, in-progress included
+        rows = self.rows[:self.closed] + [self.rows[self.closed][:8] + ["0"]] if self.closed < len(self.rows) else self.rows
+        rows = [row for row in rows if (not after or int(row[0]) < int(after)) and (not before or int(row[0]) > int(before))]
+        page = rows[::-1][:int(limit or 100)]
+        self.backfilled += len(page)
+        return {"code": "0", "msg": "", "data": page}
+
+    get_history_candlesticks = get_candlesticks
+
+async def _stream(candles, drop_every, outage, timeout=30.0):
+    import websockets
+    import streaming
+    streaming.RECONNECT_BASE_DELAY = 0.01
+    rows = synthetic_candles("15m", candles + 10)["data"][::-1]
+    feed = FakeOkxFeed(rows[10:], drop_every, outage)
+    expected = [int(row[0]) for row in rows[10:]]
+    delivered, tickers = [], []
+    done = asyncio.Event()
+    async with websockets.serve(feed.handle, "127.0.0.1", 0) as server:
+        url = f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+        stream = streaming.MarketStream(strategy.instId, bars=["15m"], backfill=streaming.rest_backfill(feed), public_url=url,
+                                        business_url=url, ping_interval=1.0)
+        # Resume point: the candles a REST seed would have loaded
+        stream.seed("15m", int(rows[9][0]))
+        @stream.on_candle
+        async def on_candle(inst_id, bar, row):
+            delivered.append(int(row[0]))
+            if len(delivered) >= len(expected):
+                done.set()
+        @stream.on_ticker
+        async def on_ticker(inst_id, ticker):
+            tickers.append(ticker)
+        started = time.perf_counter()
+        runner = asyncio.create_task(stream.run())
+        try:
+            await asyncio.wait_for(done.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        seconds = time.perf_counter() - started
+        stream.stop()
+        runner.cancel()
+        await asyncio.gather(runner, return_exceptions=True)
+    return {"ok": delivered == expected, "delivered": len(delivered), "expected": len(expected),
+            "duplicates": len(delivered) - len(set(delivered)), "connections": feed.connections,
+            "backfilled": feed.backfilled, "tickers": len(tickers), "seconds": seconds}
+
+def bench_stream(candles=STREAM_CANDLES, drop_every=STREAM_DROP_EVERY, outage=STREAM_OUTAGE):
+    return asyncio.run(_stream(candles, drop_every, outage))
+
+# Sharded workers: one in-process publisher streaming ticks to N worker processes, each running the vectorized
+# exit check over the positions of the chats it owns
+SHARD_POSITIONS = 200_000
+SHARD_TICKS = 200
+
+def _shard_chat_ids(positions):
+    return [str(7000000000 + i) for i in range(positions)]
+
+async def _shard_worker(shard, shard_count, path, positions):
+    from shards import WorkerLink
+    from position_monitor import PositionMonitor
+    link = WorkerLink(shard, shard_count, path)
+    monitor = PositionMonitor()
+    for chat_id in filter(link.owns, _shard_chat_ids(positions)):
+        monitor.add(chat_id, "long", 100.0, 5.0)
+    busy = [0.0, 0]
+    async def on_ping(message):
+        link.send({"type": "pong", "shard": shard, "latency": time.time() - message["sent"]})
+    async def on_ticker(message):
+        started = time.process_time()
+        monitor.tick(float(message["last"]))
+        busy[0] += time.process_time() - started
+        busy[1] += 1
+        if message["seq"] == message["last_seq"]:
+            link.send({"type": "done", "shard": shard, "ticks": busy[1], "busy": busy[0], "positions": len(monitor)})
+            link.stop()
+    link.on("ping", on_ping)
+    link.on("ticker", on_ticker)
+    # Connecting only after the monitor is built tells the publisher this worker is ready
+    await link.run()
+
+async def _shards(path, worker_counts, positions, ticks):
+    from shards import Publisher
+    results = {}
+    for count in worker_counts:
+        publisher = Publisher(path, count)
+        replies = {"pong": [], "done": []}
+        async def on_reply(message):
+            replies[message["type"]].append(message)
+        for kind in replies:
+            publisher.on(kind, on_reply)
+        await publisher.start()
+        children = [subprocess.Popen([sys.executable, os.path.abspath(__file__), "shard-worker", "--shard", str(shard),
+                                      "--shards", str(count), "--socket", path, "--positions", str(positions)])
+                    for shard in range(count)]
+        try:
+            while len(publisher.links) < count:
+                await asyncio.sleep(0.05)
+            for _ in range(20):
+                publisher.publish({"type": "ping", "sent": time.time()})
+                await asyncio.sleep(0.01)
+            started = time.perf_counter()
+            for seq in range(ticks):
+                publisher.publish({"type": "ticker", "inst_id": strategy.instId, "last": 100.0 + (seq % 7) * 0.01,
+                                   "seq": seq, "last_seq": ticks - 1})
+                await asyncio.sleep(0)
+            while len(replies["done"]) < count:
+                await asyncio.sleep(0.001)
+            elapsed = time.perf_counter() - started
+        finally:
+            for child in children:
+                child.wait(timeout=30)
+            await publisher.close()
+        latencies = sorted(reply["latency"] for reply in replies["pong"])
+        results[count] = {"ticks_per_s": ticks / elapsed, "positions_per_s": ticks * positions / elapsed,
+                          "max_worker_cpu_s": max(reply["busy"] for reply in replies["done"]),
+                          "fanout_p50_ms": latencies[len(latencies) // 2] * 1000}
+    return results
+
+def bench_shards(worker_counts, positions=SHARD_POSITIONS, ticks=SHARD_TICKS):
+    with tempfile.TemporaryDirectory() as tmp:
+        return asyncio.run(_shards(os.path.join(tmp, "shards.sock"), worker_counts, positions, ticks))
+
+# Sharded routing: the real worker role (goodboytrader.run_worker, Telegram stubbed at the Bot API call) behind
+# an in-process publisher. Every chat's command and signal alert must be answered by the shard that owns it
+ROUTING_CHATS = 60
+
+def _run_bot_worker(shard, shard_count):
+    # Stands in for `goodboytrader.py worker`: every Bot API call is answered locally and each sent message is
+    # reported upstream with the shard that sent it
+    import logging
+    import telegram
+    import goodboytrader
+    logging.basicConfig(level=logging.WARNING)
+    async def post(self, endpoint, data=None, **kwargs):
+        if endpoint == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "GoodBoyTrader", "username": "GoodBoyTraderBot"}
+        if endpoint == "sendMessage":
+            goodboytrader.worker_link.send({"type": "sent", "shard": shard, "chat_id": str(data["chat_id"]), "text": data["text"]})
+            return {"message_id": 1, "date": int(time.time()), "chat": {"id": int(data["chat_id"]), "type": "private"},
+                    "text": data["text"]}
+        return True
+    telegram.Bot._post = post
+    storage.init_db()
+    asyncio.run(goodboytrader.run_worker(shard, shard_count))
+
+def _command_update(update_id, chat_id, command):
+    user = {"id": int(chat_id), "is_bot": False, "first_name": "bench"}
+    return {"update_id": update_id, "message": {
+        "message_id": update_id, "date": int(time.time()), "chat": {"id": int(chat_id), "type": "private"}, "from": user,
+        "text": command, "entities": [{"type": "bot_command", "offset": 0, "length": len(command)}]}}
+
+async def _shard_routing(tmp, shard_count, chat_ids):
+    import signal
+    from telegram import Update
+    import goodboytrader
+    from shards import Publisher, shard_of
+    path = os.path.join(tmp, "shards.sock")
+    goodboytrader.publisher = publisher = Publisher(path, shard_count)
+    sent, routed, latencies = [], {}, []
+    async def on_sent(message):
+        sent.append(message)
+        if message["text"].startswith("🔍") and message["chat_id"] in routed:
+            latencies.append(time.perf_counter() - routed[message["chat_id"]])
+    publisher.on("sent", on_sent)
+    await publisher.start()
+    env = {**os.environ, "SHARD_SOCKET": path, "GOODBOY_DB": storage.DB_PATH, "GOODBOY_STATE": os.path.join(tmp, "state"),
+           "GOODBOY_CANDLES": os.path.join(tmp, "candles"), "TELEGRAM_TOKEN": "1:bench",
+           "METRICS_PORT": str(random.randint(20000, 40000))}
+    children = [subprocess.Popen([sys.executable, os.path.abspath(__file__), "shard-bot", "--shard", str(shard),
+                                  "--shards", str(shard_count)], env=env) for shard in range(shard_count)]
+    try:
+        deadline = time.perf_counter() + 60
+        while len(publisher.links) < shard_count and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+        # Publisher side as in production: route_update picks the shard from the chat
+        for i, chat_id in enumerate(chat_ids):
+            routed[chat_id] = time.perf_counter()
+            await goodboytrader.route_update(Update.de_json(_command_update(i + 1, chat_id, "/status"), None), None)
+        publisher.publish({"type": "signal", "inst_id": "BENCH-USDT-SWAP", "side": "long", "price": 1.0, "atr": 0.1})
+        while len(sent) < 2 * len(chat_ids) and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+        # Anything sent twice or by the wrong shard shows up here
+        await asyncio.sleep(0.5)
+    finally:
+        for child in children:
+            child.send_signal(signal.SIGTERM)
+        for child in children:
+            try:
+                child.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                child.kill()
+        await publisher.close()
+    replies = [message for message in sent if message["text"].startswith("🔍")]
+    alerts = [message for message in sent if message["text"].startswith("📡")]
+    misrouted = [message for message in sent if message["shard"] != shard_of(message["chat_id"], shard_count)]
+    latencies.sort()
+    return {"ok": not misrouted and sorted(m["chat_id"] for m in replies) == sorted(chat_ids)
+                  and sorted(m["chat_id"] for m in alerts) == sorted(chat_ids),
+            "replies": len(replies), "alerts": len(alerts), "misrouted": len(misrouted),
+            "per_shard": [sum(1 for m in replies if m["shard"] == shard) for shard in range(shard_count)],
+            "p50_ms": latencies[len(latencies) // 2] * 1000 if latencies else None}
+
+def bench_shard_routing(shard_count, chats=ROUTING_CHATS):
+    with tempfile.TemporaryDirectory() as tmp:
+        storage.DB_PATH = os.path.join(tmp, "routing.db")
+        storage.init_db()
+        chat_ids = _shard_chat_ids(chats)
+        expiry = (datetime.now(storage.TIMEZONE) + timedelta(days=30)).isoformat()
+        for chat_id in chat_ids:
+            storage.update_user(chat_id, "elite", 1000, expiry=expiry)
+        storage.flush()
+        storage.close()
+        return asyncio.run(_shard_routing(tmp, shard_count, chat_ids))
+
+# Cold start: fresh interpreter import time per module (what a crash restart or deploy pays before trading)
+STARTUP_MODULES = ("goodboytrader", "handlers", "trading", "storage", "strategy")
+
+def bench_startup(modules=STARTUP_MODULES, runs=5):
+    results = {}
+    for module in modules:
+        samples = []
+        for _ in range(runs):
+            output = subprocess.run([sys.executable, "-c", f"import time; t = time.perf_counter(); import {module}; "
+                                     f"print(time.perf_counter() - t); import sys; print(int('pandas' in sys.modules))"],
+                                    capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+            seconds, pandas_loaded = output.stdout.split()
+            samples.append(float(seconds))
+        results[module] = {"min_ms": min(samples) * 1000, "median_ms": statistics.median(samples) * 1000,
+                           "pandas": pandas_loaded == "1"}
+    return results
+
+# Offline suite: recorded OKX candle payloads and a fake Telegram bot, results kept per commit
+BENCH_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_data")
+RESULTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_results.jsonl")
+REGRESSION_THRESHOLD = 0.25
+BAR_MS = {"15m": 900_000, "1H": 3_600_000, "4H": 14_400_000}
+SUITE_USERS = 1000
+SUITE_STORED_CANDLES = 401 * 16
+SUITE_REFERRERS = 500
+
+def candle_fixture_path(bar):
+    return os.path.join(BENCH_DATA_DIR, f"okx_candles_{strategy.instId}_{bar}.json")
+
+def synthetic_candles(bar, count, seed=7):
+    # Deterministic random walk in the OKX payload shape (newest first), used when nothing was recorded
+    rng = random.Random(seed)
+    start = 1_700_000_000_000 - 1_700_000_000_000 % BAR_MS[bar]
+    price = 150.0
+    rows = []
+    for i in range(count):
+        open_ = price
+        price = max(1.0, price * (1 + rng.gauss(0, 0.01)))
+        high = max(open_, price) * (1 + abs(rng.gauss(0, 0.004)))
+        low = min(open_, price) * (1 - abs(rng.gauss(0, 0.004)))
+        vol = rng.uniform(1e4, 1e5)
+        rows.append([str(start + i * BAR_MS[bar]), f"{open_:.3f}", f"{high:.3f}", f"{low:.3f}", f"{price:.3f}",
+                     f"{vol:.0f}", f"{vol:.0f}", f"{vol * price:.1f}", "1"])
+    return {"code": "0", "msg": "", "data": rows[::-1]}
+
+def load_candle_payload(bar, count=1000):
+    path = candle_fixture_path(bar)
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f), "recorded"
+    return synthetic_candles(bar, count), "synthetic"
+
+async def _record_candles(bars, count):
+    client = http_client.OkxAsyncClient()
+    os.makedirs(BENCH_DATA_DIR, exist_ok=True)
+    for bar in bars:
+        rows = (await client.get_candlesticks(strategy.instId, bar=bar, limit='300'))['data']
+        while len(rows) < count:
+            page = (await client.get_history_candlesticks(strategy.instId, after=rows[-1][0], bar=bar, limit='100'))['data']
+            if not page:
+                break
+            rows.extend(page)
+        with open(candle_fixture_path(bar), "w") as f:
+            json.dump({"code": "0", "msg": "", "data": rows[:count]}, f)
+        print(f"recorded {len(rows[:count])} {bar} candles -> {candle_fixture_path(bar)}")
+    await http_client.close_http_client()
+
+def record_candles(bars, count):
+    asyncio.run(_record_candles(bars, count))
+
+class ReplayOkxClient:
+    # Stands in for the market side of http_client.OkxAsyncClient: serves a window of the recording ending at
+    # `cursor`, newest candle unconfirmed, and moves one candle forward per call when `advance` is set
+    def __init__(self, payloads, start):
+        self.rows = {bar: payload["data"][::-1] for bar, payload in payloads.items()}
+        self.start = start
+        self.cursor = dict.fromkeys(self.rows, start)
+        self.advance = False
+
+    def window(self, bar, limit):
+        rows = self.rows[bar]
+        end = self.cursor[bar]
+        if self.advance:
+            self.cursor[bar] = end + 1 if end < len(rows) else self.start
+        window = [row[:8] + ['1'] for row in rows[max(0, end - int(limit or 100)):end]]
+        window[-1][8] = '0'
+        return window[::-1]
+
+    async def get_candlesticks(self, instId, after='', before='', bar='', limit=''):
+        return {"code": "0", "msg": "", "data": self.window(bar, limit)}
+
+class FakeBot:
+    # Telegram Bot stand-in: answers like the Bot API without touching the network
+    def __init__(self):
+        self.sent = 0
+        self.pinned = 0
+
+    async def send_message(self, chat_id, text, parse_mode=None, reply_markup=None):
+        self.sent += 1
+        return SimpleNamespace(message_id=self.sent, chat_id=chat_id, text=text)
+
+    async def pin_chat_message(self, chat_id, message_id, disable_notification=False):
+        self.pinned += 1
+        return True
+
+class FakeMessage:
+    def __init__(self, chat_id):
+        self.chat_id = int(chat_id)
+        self.replies = 0
+
+    async def reply_text(self, text, reply_markup=None, parse_mode=None):
+        self.replies += 1
+
+def fake_update(chat_id):
+    return SimpleNamespace(message=FakeMessage(chat_id), callback_query=None, effective_chat=SimpleNamespace(id=int(chat_id)))
+
+def _seed_suite_db(chat_ids):
+    now = datetime.now(storage.TIMEZONE)
+    last_month = (now.replace(day=1) - timedelta(days=1)).strftime('%Y-%m')
+    trade = sample_trade()
+    for i, chat_id in enumerate(chat_ids):
+        if i % 2:
+            storage.update_user(chat_id, "standard", 500, expiry=(now + timedelta(days=30)).isoformat(),
+                                api_key=f"key{i}", api_secret=f"secret{i}", api_pass="pass", wallet=f"T{i:033d}")
+        else:
+            storage.update_user(chat_id, "free", 0, expiry=(now + timedelta(days=14)).isoformat())
+        storage.execute_many([(storage.INSERT_TRADE, (chat_id, (now - timedelta(hours=4 * n)).isoformat(), 126.7,
+                                                      now.isoformat(), 124.4, "short", 2.5, 5.75)) for n in range(20)])
+    storage.execute_many([(storage.INSERT_REFERRAL, (chat_ids[i], chat_ids[i + 1], now.isoformat()))
+                          for i in range(min(SUITE_REFERRERS, len(chat_ids) - 1))])
+    storage.execute_many([("INSERT INTO referral_monthly (referrer_id, month, profit) VALUES (?, ?, ?)",
+                           (chat_ids[i], last_month, 1.5)) for i in range(min(SUITE_REFERRERS, len(chat_ids)))])
+    storage.flush()
+    return trade
+
+def _suite_cases(trading, handlers, chat_ids, okx_client, trade):
+    users = iter(range(1 << 62))
+    def next_user():
+        return chat_ids[next(users) % len(chat_ids)]
+    async def seed_rest():
+        # refresh_market_data's cold path when the store cannot seed: the full window over REST, then the seed
+        okx_client.advance = False
+        response = await okx_client.get_candlesticks(strategy.instId, bar='4H', limit='400')
+        trading._seed_state(strategy.instId, '4H', response['data'][::-1], '400')
+    def seed_incremental():
+        okx_client.advance = False
+        trading._seed_state(strategy.instId, '4H', okx_client.window('4H', '400')[::-1], '400')
+        okx_client.advance = True
+    async def incremental():
+        # 4H: nothing to write to the 15m candle store, so only the fetch and the indicator update are timed
+        await trading.refresh_market_data(strategy.instId, '4H')
+    def reset_payouts():
+        storage.execute("UPDATE referral_monthly SET paid = 0")
+        storage.flush()
+    async def tracker_update():
+        chat_id = next_user()
+        await trading.TradeTracker().update({**trade, "exit_type": "Trailing Stop"}, chat_id)
+    def handler(fn):
+        async def run():
+            await fn(fake_update(next_user()), SimpleNamespace(args=[], job=None))
+        return run
+    async def payout():
+        await handlers.monthly_payout(SimpleNamespace(job=None))
+    return [
+        # name, callable, calls per round, setup before each round, flush queued writes inside the timing
+        ("market_data/seed_rest", seed_rest, 5, None, False),
+        ("market_data/incremental", incremental, 50, seed_incremental, False),
+        ("candle_store/seed_15m", lambda: trading._seed_stored(strategy.instId, '15m', '400'), 50, None, False),
+        ("candle_store/seed_4H", lambda: trading._seed_stored(strategy.instId, '4H', '400'), 20, None, False),
+        ("trade_tracker_update", tracker_update, 200, None, True),
+        ("state_journal/record", lambda: trading.state_journal.record("trades", next_user(), trade), 2000, None, False),
+        ("get_user/cached", lambda: storage.get_user(next_user()), 2000, None, False),
+        ("get_user/uncached", lambda: storage.get_user(next_user()), 500, storage.user_cache.invalidate, False),
+        ("update_user", lambda: storage.update_user(next_user(), "standard", 500), 500, None, True),
+        ("handler/start", handler(handlers.start), 200, None, True),
+        ("handler/pnl", handler(handlers.pnl), 500, None, False),
+        ("handler/status", handler(handlers.status), 500, None, False),
+        ("handler/history", handler(handlers.history), 500, None, False),
+        ("monthly_payout", payout, 1, reset_payouts, True),
+    ]
+
+async def _time_case(fn, number, repeat, setup, flush, after_round):
+    is_async = asyncio.iscoroutinefunction(fn)
+    rounds = []
+    for _ in range(repeat + 1):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        for _ in range(number):
+            if is_async:
+                await fn()
+            else:
+                fn()
+        if flush:
+            storage.flush()
+        rounds.append((time.perf_counter() - start) / number)
+        after_round()
+    # First round is warm-up
+    return rounds[1:]
+
+def bench_suite(repeat=5, only=None):
+    import logging
+    import trading
+    import handlers
+    from broadcast import Broadcaster
+    from candles import parse_rows
+    from candle_store import CandleStore, from_block
+    from journal import StateJournal
+    logging.getLogger().setLevel(logging.WARNING)
+    payloads, sources = {}, set()
+    for bar in ("4H", "15m"):
+        payloads[bar], source = load_candle_payload(bar)
+        sources.add(source)
+    okx_client = ReplayOkxClient(payloads, start=400)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        storage.DB_PATH = os.path.join(tmp, "suite.db")
+        storage.init_db()
+        chat_ids = [str(7000000000 + i) for i in range(SUITE_USERS)]
+        trade = _seed_suite_db(chat_ids)
+        # Warm-restart seeding reads 400 4H candles' worth of 15m history from the local store
+        trading.candle_store = CandleStore(os.path.join(tmp, "candles"))
+        stored = synthetic_candles("15m", SUITE_STORED_CANDLES)["data"][::-1]
+        trading.candle_store.series(strategy.instId, "15m").append(from_block(parse_rows(stored)))
+        trading.okx_client = okx_client
+        trading.state_journal = StateJournal("suite", os.path.join(tmp, "state")).open()
+        trading.broadcaster = Broadcaster(FakeBot())
+        def after_round():
+            # Broadcaster is never started: drop what the round queued so rounds stay comparable
+            trading.broadcaster.pending.clear()
+        loop = asyncio.new_event_loop()
+        for name, fn, number, setup, flush in _suite_cases(trading, handlers, chat_ids, okx_client, trade):
+            if only and not any(name.startswith(prefix) for prefix in only):
+                continue
+            rounds = loop.run_until_complete(_time_case(fn, number, repeat, setup, flush, after_round))
+            results[name] = {"median_us": statistics.median(rounds) * 1e6, "min_us": min(rounds) * 1e6,
+                             "number": number, "repeat": repeat}
+        loop.close()
+        trading.state_journal.close()
+        storage.close()
+    return {"candles": "+".join(sorted(sources)), "results": results}
+
+# Results history
+def current_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                                    capture_output=True, text=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+    return commit, dirty
+
+def load_results(path=RESULTS_PATH):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def save_results(run, path=RESULTS_PATH):
+    with open(path, "a") as f:
+        f.write(json.dumps(run) + "\n")
+
+def find_baseline(history, run, baseline=None):
+    # Latest earlier run on another commit with the same candle source, or the named commit
+    for previous in reversed(history):
+        if previous["candles"] != run["candles"]:
+            continue
+        if baseline is not None and previous["commit"].startswith(baseline):
+            return previous
+        if baseline is None and (previous["commit"], previous["dirty"]) != (run["commit"], run["dirty"]):
+            return previous
+    return None
+
+def compare_results(run, previous, threshold=REGRESSION_THRESHOLD):
+    # Returns [(name, baseline_us, current_us, change, regressed)] on the median per-call time
+    rows = []
+    for name, stats in run["results"].items():
+        before = previous["results"].get(name) if previous else None
+        if before is None:
+            rows.append((name, None, stats["median_us"], None, False))
+            continue
+        change = stats["median_us"] / before["median_us"] - 1
+        rows.append((name, before["median_us"], stats["median_us"], change, change > threshold))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="GoodBoyTrader benchmarks")
+    subparsers = parser.add_subparsers(dest="command")
+    storage_parser = subparsers.add_parser("storage", help="users/s through the data-access layer")
+    storage_parser.add_argument("--users", type=int, default=500)
+    load_parser = subparsers.add_parser("loadtest", help="handler latency while the upstream is slow")
+    load_parser.add_argument("--upstream-delay", type=float, default=1.0)
+    load_parser.add_argument("--duration", type=float, default=3.0)
+    fanout_parser = subparsers.add_parser("fanout", help="order fan-out skew against a mock exchange")
+    fanout_parser.add_argument("--users", type=int, default=200)
+    fanout_parser.add_argument("--exchange-delay", type=float, default=0.05)
+    suite_parser = subparsers.add_parser("suite", help="offline hot-path suite, compared against an earlier commit")
+    suite_parser.add_argument("--repeat", type=int, default=5)
+    suite_parser.add_argument("--only", nargs="*", help="run only cases starting with these names")
+    suite_parser.add_argument("--baseline", help="commit to compare against (default: latest run on another commit)")
+    suite_parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="allowed slowdown before a case is flagged")
+    suite_parser.add_argument("--no-save", action="store_true", help="do not append this run to the results history")
+    scheduler_parser = subparsers.add_parser("scheduler", help="signal scheduler round time as instruments are added")
+    scheduler_parser.add_argument("--instruments", type=int, nargs="*", default=[1, 4, 16, 32])
+    scheduler_parser.add_argument("--upstream-delay", type=float, default=0.2)
+    stream_parser = subparsers.add_parser("stream", help="stream reconnects and REST backfill against a fake OKX WebSocket")
+    stream_parser.add_argument("--candles", type=int, default=STREAM_CANDLES)
+    stream_parser.add_argument("--drop-every", type=int, default=STREAM_DROP_EVERY)
+    stream_parser.add_argument("--outage", type=int, default=STREAM_OUTAGE)
+    shards_parser = subparsers.add_parser("shards", help="tick fan-out to sharded worker processes on this machine")
+    shards_parser.add_argument("--workers", type=int, nargs="*", default=[1, 2, 4])
+    shards_parser.add_argument("--positions", type=int, default=SHARD_POSITIONS)
+    shards_parser.add_argument("--ticks", type=int, default=SHARD_TICKS)
+    worker_parser = subparsers.add_parser("shard-worker", help="one worker process of the shards benchmark")
+    worker_parser.add_argument("--shard", type=int, required=True)
+    worker_parser.add_argument("--shards", type=int, required=True)
+    worker_parser.add_argument("--socket", required=True)
+    worker_parser.add_argument("--positions", type=int, default=SHARD_POSITIONS)
+    routing_parser = subparsers.add_parser("shard-routing", help="real worker processes: each chat answered by its own shard")
+    routing_parser.add_argument("--shards", type=int, default=3)
+    routing_parser.add_argument("--chats", type=int, default=ROUTING_CHATS)
+    bot_parser = subparsers.add_parser("shard-bot", help="one worker process of the shard-routing check")
+    bot_parser.add_argument("--shard", type=int, required=True)
+    bot_parser.add_argument("--shards", type=int, required=True)
+    startup_parser = subparsers.add_parser("startup", help="cold import time per module")
+    startup_parser.add_argument("--runs", type=int, default=5)
+    record_parser = subparsers.add_parser("record", help="record OKX candle payloads for the suite (needs network)")
+    record_parser.add_argument("--bars", nargs="*", default=["4H", "15m"])
+    record_parser.add_argument("--count", type=int, default=1000)
+    args = parser.parse_args()
+    if args.command == "scheduler":
+        for count, stats in bench_scheduler(args.instruments, args.upstream_delay).items():
+            print(f"scheduler: {count:3} instruments x 2 bars | sequential seed {stats['sequential_s']:.2f} s | "
+                  f"concurrent seed {stats['seed_s']:.2f} s | round {stats['round_s']:.2f} s "
+                  f"({stats['round_cpu_s'] * 1000:.0f} ms CPU)")
+        return
+    if args.command == "stream":
+        stats = bench_stream(args.candles, args.drop_every, args.outage)
+        print(f"stream: {stats['delivered']}/{stats['expected']} candles over {stats['connections']} connections | "
+              f"{stats['backfilled']} rows served over REST | {stats['duplicates']} duplicates | "
+              f"{stats['tickers']} tickers | {stats['seconds']:.2f} s | {'in order, exactly once' if stats['ok'] else 'FAILED'}")
+        if not stats["ok"]:
+            sys.exit(1)
+        return
+    if args.command == "shards":
+        for count, stats in bench_shards(args.workers, args.positions, args.ticks).items():
+            print(f"shards: {count:2} workers x {args.positions // count} positions | {stats['ticks_per_s']:.0f} ticks/s "
+                  f"({stats['positions_per_s'] / 1e6:.1f}M position checks/s) | busiest worker {stats['max_worker_cpu_s']:.2f} s CPU "
+                  f"| fan-out p50 {stats['fanout_p50_ms']:.2f} ms")
+        return
+    if args.command == "shard-worker":
+        asyncio.run(_shard_worker(args.shard, args.shards, args.socket, args.positions))
+        return
+    if args.command == "shard-routing":
+        stats = bench_shard_routing(args.shards, args.chats)
+        print(f"shard-routing: {args.shards} workers x {args.chats} chats | {stats['replies']} command replies "
+              f"(per shard {stats['per_shard']}) | {stats['alerts']} signal alerts | {stats['misrouted']} from a non-owning shard | "
+              f"update->reply p50 {stats['p50_ms'] or 0:.1f} ms | {'ok' if stats['ok'] else 'FAILED'}")
+        if not stats["ok"]:
+            sys.exit(1)
+        return
+    if args.command == "shard-bot":
+        _run_bot_worker(args.shard, args.shards)
+        return
+    if args.command == "startup":
+        for module, stats in bench_startup(runs=args.runs).items():
+            print(f"startup: import {module:14} min {stats['min_ms']:6.0f} ms | median {stats['median_ms']:6.0f} ms"
+                  f"{' | loads pandas' if stats['pandas'] else ''}")
+        return
+    if args.command == "record":
+        record_candles(args.bars, args.count)
+        return
+    if args.command == "suite":
+        commit, dirty = current_commit()
+        run = {"commit": commit, "dirty": dirty, "time": datetime.now(storage.TIMEZONE).isoformat(),
+               "python": sys.version.split()[0], **bench_suite(args.repeat, args.only)}
+        previous = find_baseline(load_results(), run, args.baseline)
+        rows = compare_results(run, previous, args.threshold)
+        label = f"{previous['commit']}{'+' if previous['dirty'] else ''}" if previous else "none"
+        print(f"suite @ {commit}{'+' if dirty else ''} ({run['candles']} candles) vs {label}")
+        for name, before, after, change, regressed in rows:
+            delta = f"{change:+.0%}" if change is not None else "new"
+            before_text = f"{before:.1f}" if before is not None else "-"
+            print(f"  {name:32} {before_text:>10} -> {after:10.1f} us/call  {delta:>6}{'  REGRESSION' if regressed else ''}")
+        if not args.no_save:
+            save_results(run)
+        if any(row[4] for row in rows):
+            sys.exit(1)
+        return
+    if args.command == "fanout":
+        results = bench_fanout(args.users, args.exchange_delay)
+        print(f"fanout: {args.users} users | first-to-last ack before {results['before_skew_ms']:.0f} ms | "
+              f"after {results['after_skew_ms']:.0f} ms (total {results['after_total_ms']:.0f} ms, p50 submit-to-ack {results['p50_ms']:.0f} ms)")
+        return
+    if args.command == "loadtest":
+        results = bench_loadtest(args.upstream_delay, args.duration)
+        for label, stats in results.items():
+            print(f"loadtest {label}: upstream {args.upstream_delay:.1f}s | handler p50 {stats['p50_ms']:.1f} ms | "
+                  f"p99 {stats['p99_ms']:.1f} ms | max {stats['max_ms']:.1f} ms")
+        return
+    users = getattr(args, "users", 500)
+    results = bench_storage(users)
+    print(f"storage: {users} users | before {results['before']:.0f} users/s | after {results['after']:.0f} users/s | "
+          f"{results['after'] / results['before']:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import timedelta
+from telegram.error import RetryAfter, Forbidden, BadRequest
+import metrics
+from ratelimit import TokenBucket
+
+# Telegram Bot API limits: ~30 messages/s overall, ~1 message/s per chat
+GLOBAL_RATE = 30
+PER_CHAT_INTERVAL = 1.0
+WORKERS = 8
+MAX_RETRIES = 3
+MAX_MESSAGE_LENGTH = 4096
+
+class Broadcaster:
+    def __init__(self, bot, workers=WORKERS, global_rate=GLOBAL_RATE, per_chat_interval=PER_CHAT_INTERVAL, max_retries=MAX_RETRIES):
+        self.bot = bot
+        self.workers = workers
+        self.bucket = TokenBucket(global_rate)
+        self.per_chat_interval = per_chat_interval
+        self.max_retries = max_retries
+        self.pending = {}
+        self.next_allowed = {}
+        self.paused_until = 0.0
+        self.sent = 0
+        self.failed = 0
+        self.coalesced = 0
+        self.in_flight = 0
+        self._scheduled = set()
+        self._ready = None
+        self._tasks = []
+
+    def start(self):
+        if self._tasks:
+            return
+        self._ready = asyncio.Queue()
+        # The registry keeps the first gauge of a name, so the running broadcaster rebinds its callback
+        metrics.gauge("telegram_queue_depth", "Telegram messages queued or in flight").callback = self.depth
+        for chat_id in self.pending:
+            self._schedule(chat_id)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, drain=True, timeout=10):
+        if drain:
+            deadline = time.monotonic() + timeout
+            while self.depth() and time.monotonic() < deadline:
+                await asyncio.sleep(0.05)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Messages still pending stay queued for the next start(), which schedules every pending chat again
+        self._ready = None
+        self._scheduled.clear()
+
+    def send(self, chat_id, text, parse_mode='Markdown', reply_markup=None, pin=False):
+        # Non-blocking: queues the message and returns immediately
+        chat_id = str(chat_id)
+        self.pending.setdefault(chat_id, deque()).append(
+            {"text": text, "parse_mode": parse_mode, "reply_markup": reply_markup, "pin": pin, "attempts": 0})
+        self._schedule(chat_id)
+
+    def depth(self):
+        return sum(len(jobs) for jobs in self.pending.values()) + self.in_flight
+
+    def stats(self):
+        return {"queue_depth": self.depth(), "chats_pending": len(self.pending), "sent": self.sent,
+                "failed": self.failed, "coalesced": self.coalesced}
+
+    def _schedule(self, chat_id):
+        # A chat is queued or being served at most once, so its messages stay in order
+        if self._ready is None or chat_id in self._scheduled:
+            return
+        self._scheduled.add(chat_id)
+        self._ready.put_nowait(chat_id)
+
+    def _requeue(self, chat_id, delay):
+        if delay > 0:
+            asyncio.get_running_loop().call_later(delay, self._ready.put_nowait, chat_id)
+        else:
+            self._ready.put_nowait(chat_id)
+
+    def _take(self, chat_id):
+        # Merge consecutive plain messages for a chat into one send
+        jobs = self.pending[chat_id]
+        job = jobs.popleft()
+        if "pin_message_id" in job or job["pin"] or job["reply_markup"] is not None:
+            return job
+        while jobs and "pin_message_id" not in jobs[0] and not jobs[0]["pin"] and jobs[0]["reply_markup"] is None \
+                and jobs[0]["parse_mode"] == job["parse_mode"] \
+                and len(job["text"]) + len(jobs[0]["text"]) + 2 <= MAX_MESSAGE_LENGTH:
+            job = {**job, "text": f"{job['text']}\n\n{jobs.popleft()['text']}"}
+            self.coalesced += 1
+        return job
+
+    async def _worker(self):
+        while True:
+            chat_id = await self._ready.get()
+            if not self.pending.get(chat_id):
+                self._release(chat_id)
+                continue
+            wait = max(self.next_allowed.get(chat_id, 0), self.paused_until) - time.monotonic()
+            if wait > 0:
+                self._requeue(chat_id, wait)
+                continue
+            job = self._take(chat_id)
+            kind = "pin" if "pin_message_id" in job else "send"
+            outcome = "error"
+            started = time.perf_counter()
+            self.in_flight += 1
+            try:
+                await self._deliver(chat_id, job)
+                self.sent += 1
+                outcome = "ok"
+            except RetryAfter as e:
+                outcome = "retry_after"
+                retry_after = e.retry_after.total_seconds() if isinstance(e.retry_after, timedelta) else e.retry_after
+                logging.warning(f"Telegram flood limit hit, pausing sends for {retry_after}s")
+                self.paused_until = time.monotonic() + retry_after
+                self._retry(chat_id, job)
+            except (Forbidden, BadRequest) as e:
+                outcome = "rejected"
+                self.failed += 1
+                logging.error(f"Failed to send alert to {chat_id}: {str(e)}")
+            except Exception as e:
+                logging.error(f"Send to {chat_id} failed (attempt {job['attempts'] + 1}): {str(e)}")
+                self._retry(chat_id, job)
+            finally:
+                self.in_flight -= 1
+                metrics.telegram_send_seconds.observe(time.perf_counter() - started, kind=kind, outcome=outcome)
+            self.next_allowed[chat_id] = time.monotonic() + self.per_chat_interval
+            if self.pending.get(chat_id):
+                self._requeue(chat_id, max(self.per_chat_interval, self.paused_until - time.monotonic()))
+            else:
+                self._release(chat_id)
+
+    def _release(self, chat_id):
+        self._scheduled.discard(chat_id)
+        self.pending.pop(chat_id, None)
+        if len(self.next_allowed) > 10000:
+            now = time.monotonic()
+            self.next_allowed = {chat: until for chat, until in self.next_allowed.items() if until > now}
+
+    def _retry(self, chat_id, job):
+        job["attempts"] += 1
+        if job["attempts"] > self.max_retries:
+            self.failed += 1
+            logging.error(f"Giving up on message to {chat_id} after {job['attempts']} attempts")
+            return
+        self.pending.setdefault(chat_id, deque()).appendleft(job)
+
+    async def _deliver(self, chat_id, job):
+        await self.bucket.acquire()
+        if "pin_message_id" in job:
+            await self.bot.pin_chat_message(chat_id=chat_id, message_id=job["pin_message_id"], disable_notification=True)
+            logging.info(f"Pinned latest trade for {chat_id}")
+            return
+        message = await self.bot.send_message(chat_id=chat_id, text=job["text"], parse_mode=job["parse_mode"],
+                                              reply_markup=job["reply_markup"])
+        logging.info(f"Alert sent to {chat_id}: {job['text']}")
+        if job["pin"]:
+            # Pin goes out as its own job so it gets its own rate-limit slot and retries
+            self.pending[chat_id].appendleft({"pin_message_id": message.message_id, "attempts": 0})
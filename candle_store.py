@@ -0,0 +1,280 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import shutil
+import time
+import numpy as np
+import metrics
+from candles import parse_rows
+from scheduler import BAR_SECONDS
+
+# On-disk candle history: one directory per instrument and bar, one append-only little-endian file per column,
+# read back through read-only memory maps. Only confirmed candles are stored.
+CANDLE_STORE_DIR = os.getenv("GOODBOY_CANDLES", "candles")
+COLUMNS = (("ts", "<i8"), ("open", "<f8"), ("high", "<f8"), ("low", "<f8"), ("close", "<f8"), ("vol", "<f8"))
+# Fetched from OKX and stored; longer bars are resampled from it on read
+BASE_BAR = "15m"
+# History kept when an instrument is first stored: 400 4H candles need ~67 days of 15m data
+BACKFILL_DAYS = int(os.getenv("CANDLE_BACKFILL_DAYS", "70"))
+# history-candles returns at most 100 rows per call
+HISTORY_PAGE = 100
+
+backfilled_candles = metrics.counter("candle_store_backfilled_total", "Candles backfilled into the local store")
+
+def bar_ms(bar):
+    return BAR_SECONDS[bar] * 1000
+
+def empty_columns():
+    return {name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS}
+
+def as_block(columns):
+    # {column: array} -> rows x OHLCV float64 block (the CandleBuffer layout)
+    return np.column_stack([np.asarray(columns[name], dtype=np.float64) for name, _ in COLUMNS])
+
+def from_block(block):
+    # rows x OHLCV float64 block (parse_rows output) -> {column: array}
+    return {name: block[:, i].astype(dtype) for i, (name, dtype) in enumerate(COLUMNS)}
+
+def resample(columns, bar, base=BASE_BAR):
+    # Aggregates base candles into UTC-aligned `bar` candles; a partial first or last bucket is dropped
+    ts = columns["ts"]
+    if not len(ts):
+        return empty_columns()
+    step = bar_ms(bar)
+    buckets = ts - ts % step
+    starts = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1])))
+    ends = np.concatenate((starts[1:], [len(ts)])) - 1
+    keep = np.ones(len(starts), dtype=bool)
+    keep[0] &= ts[starts[0]] == buckets[starts[0]]
+    keep[-1] &= ts[ends[-1]] == buckets[ends[-1]] + step - bar_ms(base)
+    return {
+        "ts": buckets[starts][keep],
+        "open": columns["open"][starts][keep],
+        "high": np.maximum.reduceat(columns["high"], starts)[keep],
+        "low": np.minimum.reduceat(columns["low"], starts)[keep],
+        "close": columns["close"][ends][keep],
+        "vol": np.add.reduceat(columns["vol"], starts)[keep],
+    }
+
+class CandleSeries:
+    # One instrument and bar. The length is that of the shortest column, so a write torn by a crash is ignored
+    # on read and overwritten by the next append.
+    def __init__(self, path):
+        self.path = path
+
+    def _file(self, name):
+        return os.path.join(self.path, f"{name}.bin")
+
+    def __len__(self):
+        try:
+            return min(os.path.getsize(self._file(name)) // 8 for name, _ in COLUMNS)
+        except FileNotFoundError:
+            return 0
+
+    def _ts_at(self, index):
+        return int(np.fromfile(self._file("ts"), dtype="<i8", count=1, offset=index * 8)[0])
+
+    @property
+    def first_ts(self):
+        return self._ts_at(0) if len(self) else None
+
+    @property
+    def last_ts(self):
+        count = len(self)
+        return self._ts_at(count - 1) if count else None
+
+    def _mapped(self):
+        count = len(self)
+        if not count:
+            return empty_columns()
+        return {name: np.memmap(self._file(name), dtype=dtype, mode="r", shape=(count,)) for name, dtype in COLUMNS}
+
+    def columns(self, start=None, end=None):
+        # Zero-copy {column: array} of candles with start <= ts < end, oldest first
+        columns = self._mapped()
+        lo = 0 if start is None else int(np.searchsorted(columns["ts"], start))
+        hi = len(columns["ts"]) if end is None else int(np.searchsorted(columns["ts"], end))
+        return {name: values[lo:hi] for name, values in columns.items()}
+
+    def tail(self, count):
+        return {name: values[-count:] for name, values in self._mapped().items()}
+
+    def append(self, columns):
+        # Candles newer than the last stored one, deduplicated by ts; returns how many were written
+        stored = len(self)
+        last = self._ts_at(stored - 1) if stored else None
+        ts, index = np.unique(np.asarray(columns["ts"], dtype=np.int64), return_index=True)
+        if last is not None:
+            index = index[ts > last]
+        if not len(index):
+            return 0
+        os.makedirs(self.path, exist_ok=True)
+        for name, dtype in COLUMNS:
+            path = self._file(name)
+            with open(path, "ab") as f:
+                if f.tell() != stored * 8:
+                    f.truncate(stored * 8)
+                f.write(np.asarray(columns[name])[index].astype(dtype).tobytes())
+        return len(index)
+
+    def replace(self, columns):
+        # Rewrites the series (history older than the first candle cannot be appended); readers holding
+        # maps of the old files keep them until they are done
+        staging, retired = self.path + ".new", self.path + ".old"
+        shutil.rmtree(staging, ignore_errors=True)
+        CandleSeries(staging).append(columns)
+        if os.path.exists(self.path):
+            os.rename(self.path, retired)
+        os.rename(staging, self.path)
+        shutil.rmtree(retired, ignore_errors=True)
+
+async def fetch_range(client, inst_id, bar, start, end=None):
+    # Confirmed candles with start <= ts < end (end None: up to the latest), paging back through
+    # history-candles; None if OKX cannot be reached, so a partial range is never stored
+    from http_client import fetch_with_retries_async
+    rows = []
+    cursor = '' if end is None else str(end)
+    while True:
+        response = await fetch_with_retries_async(
+            lambda: client.get_history_candlesticks(inst_id, after=cursor, bar=bar, limit=str(HISTORY_PAGE)))
+        if not response:
+            return None
+        page = response['data']
+        rows.extend(row for row in page if row[8] == '1' and int(row[0]) >= start)
+        if not page or int(page[-1][0]) <= start:
+            break
+        cursor = page[-1][0]
+    if not rows:
+        return empty_columns()
+    block = parse_rows(rows)
+    return from_block(block[np.argsort(block[:, 0], kind="stable")])
+
+class CandleStore:
+    def __init__(self, root=CANDLE_STORE_DIR):
+        self.root = root
+        self._syncs = {}
+
+    def series(self, inst_id, bar):
+        return CandleSeries(os.path.join(self.root, inst_id, bar))
+
+    @staticmethod
+    def source_bar(bar):
+        # Bar actually stored for `bar`: whole multiples of BASE_BAR are resampled from it
+        seconds, base = BAR_SECONDS[bar], BAR_SECONDS[BASE_BAR]
+        return BASE_BAR if seconds > base and seconds % base == 0 else bar
+
+    def load(self, inst_id, bar, start=None, end=None):
+        # {column: array} for start <= ts < end; zero-copy maps for stored bars, resampled for derived ones
+        source = self.source_bar(bar)
+        if source == bar:
+            return self.series(inst_id, bar).columns(start, end)
+        if start is not None:
+            start -= start % bar_ms(bar)
+        return resample(self.series(inst_id, source).columns(start, end), bar, source)
+
+    def tail(self, inst_id, bar, count):
+        # Latest `count` candles (fewer if the store is short)
+        source = self.source_bar(bar)
+        if source == bar:
+            return self.series(inst_id, bar).tail(count)
+        ratio = BAR_SECONDS[bar] // BAR_SECONDS[source]
+        columns = resample(self.series(inst_id, source).tail((count + 1) * ratio), bar, source)
+        return {name: values[-count:] for name, values in columns.items()}
+
+    def record(self, inst_id, bar, columns):
+        # Live candles already fetched for indicators; False on a gap after the last stored candle,
+        # which only a backfill can fill
+        series = self.series(inst_id, bar)
+        last = series.last_ts
+        if last is None:
+            return False
+        newer = columns["ts"][columns["ts"] > last]
+        if not len(newer):
+            return True
+        if int(newer.min()) != last + bar_ms(bar):
+            return False
+        series.append(columns)
+        return True
+
+    async def backfill(self, client, inst_id, bar=BASE_BAR, since=None):
+        # Fetches everything missing after the last stored candle (the last BACKFILL_DAYS for a new series)
+        # and, when `since` predates the store, the older range too; returns candles added or None on failure
+        series = self.series(inst_id, bar)
+        last = series.last_ts
+        step = bar_ms(bar)
+        if last is None:
+            since = since if since is not None else int(time.time() * 1000) - BACKFILL_DAYS * 86400 * 1000
+            newer = await fetch_range(client, inst_id, bar, since - since % step)
+        elif last + step >= int(time.time() * 1000) // step * step and since is None:
+            # Nothing has closed since the last stored candle
+            return 0
+        else:
+            newer = await fetch_range(client, inst_id, bar, last + step)
+        if newer is None:
+            logging.error(f"Candle backfill failed for {inst_id} {bar}")
+            return None
+        added = series.append(newer)
+        first = series.first_ts
+        if last is not None and since is not None and since < first:
+            older = await fetch_range(client, inst_id, bar, since - since % step, first)
+            if older is None:
+                logging.error(f"Candle history backfill failed for {inst_id} {bar}")
+            elif len(older["ts"]):
+                current = series.columns()
+                series.replace({name: np.concatenate((older[name], current[name])) for name, _ in COLUMNS})
+                added += len(older["ts"])
+        if added:
+            backfilled_candles.inc(added, inst_id=inst_id, bar=bar)
+            logging.info(f"Backfilled {added} {bar} candles for {inst_id} into {series.path}")
+        return added
+
+    async def sync(self, client, inst_id, bar=BASE_BAR):
+        # backfill() shared by concurrent callers, e.g. the scheduler refreshing two bars of one instrument
+        key = (inst_id, bar)
+        task = self._syncs.get(key)
+        if task is None:
+            task = self._syncs[key] = asyncio.ensure_future(self.backfill(client, inst_id, bar))
+            task.add_done_callback(lambda _: self._syncs.pop(key, None))
+        return await asyncio.shield(task)
+
+# CLI: fill the store ahead of a backtest, or look at what is in it
+async def _backfill_command(args):
+    from http_client import OkxAsyncClient, close_http_client
+    store = CandleStore(args.root)
+    since = int(time.time() * 1000) - args.days * 86400 * 1000 if args.days else None
+    try:
+        for inst_id in args.instruments:
+            added = await store.backfill(OkxAsyncClient(flag='0'), inst_id, args.bar, since)
+            print(json.dumps({"inst_id": inst_id, "bar": args.bar, "added": added,
+                              "stored": len(store.series(inst_id, args.bar))}))
+    finally:
+        await close_http_client()
+
+def _show_command(args):
+    columns = CandleStore(args.root).tail(args.inst_id, args.bar, args.count)
+    for row in zip(*(columns[name].tolist() for name, _ in COLUMNS)):
+        print(json.dumps(dict(zip((name for name, _ in COLUMNS), row))))
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OKX candle store")
+    parser.add_argument("--root", default=CANDLE_STORE_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+    backfill = commands.add_parser("backfill", help="fetch missing candles from OKX")
+    backfill.add_argument("instruments", nargs="+")
+    backfill.add_argument("--bar", default=BASE_BAR)
+    backfill.add_argument("--days", type=int, help="extend history back this many days")
+    show = commands.add_parser("show", help="print the latest stored (or resampled) candles")
+    show.add_argument("inst_id")
+    show.add_argument("--bar", default="4H")
+    show.add_argument("--count", type=int, default=10)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.command == "backfill":
+        asyncio.run(_backfill_command(args))
+    else:
+        _show_command(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import numpy as np
+
+# OKX candle row: ts, open, high, low, close, vol, volCcy, volCcyQuote, confirm (all strings)
+OHLCV = ("timestamp", "open", "high", "low", "close", "vol")
+
+def parse_rows(rows):
+    # One pass from OKX string rows to float64 columns; timestamps (ms) are exact in float64
+    return np.array([row[:6] for row in rows], dtype=np.float64).reshape(-1, len(OHLCV))
+
+class CandleBuffer:
+    # Fixed-capacity OHLCV + indicator columns, preallocated once per instrument and bar.
+    # Every row is written twice (slot and slot + size), so the latest `limit` rows are always one
+    # contiguous slice and view() never copies. One spare slot holds the in-progress candle.
+    def __init__(self, limit, indicator_columns=()):
+        self.limit = limit
+        self.size = limit + 1
+        self.columns = list(OHLCV) + list(indicator_columns)
+        self.data = np.full((len(self.columns), 2 * self.size), np.nan)
+        self.count = 0
+        self.live = False
+
+    def __len__(self):
+        return min(self.count, self.limit)
+
+    @property
+    def last_ts(self):
+        return int(self.data[0, (self.count - 1) % self.size]) if self.count else None
+
+    def append(self, values):
+        # values: one row in column order (OHLCV then indicators)
+        slot = self.count % self.size
+        self.data[:, slot] = values
+        self.data[:, slot + self.size] = values
+        self.count += 1
+        self.live = False
+
+    def extend(self, block):
+        # block: rows x columns array, oldest first; only the newest `limit` rows are kept
+        block = np.asarray(block, dtype=np.float64)[-self.limit:]
+        slot = self.count % self.size
+        first = min(len(block), self.size - slot)
+        for offset in (0, self.size):
+            self.data[:, slot + offset:slot + offset + first] = block[:first].T
+            self.data[:, offset:offset + len(block) - first] = block[first:].T
+        self.count += len(block)
+        self.live = False
+
+    def set_live(self, values):
+        # Provisional row for the unconfirmed candle; replaced by the next append()
+        slot = self.count % self.size
+        self.data[:, slot] = values
+        self.data[:, slot + self.size] = values
+        self.live = True
+
+    def view(self, live=True):
+        # Zero-copy {column: array} of the latest rows, oldest first; valid until the next write
+        end = self.count % self.size + self.size + (1 if live and self.live else 0)
+        start = end - min(self.count + (1 if live and self.live else 0), self.limit)
+        return {name: self.data[i, start:end] for i, name in enumerate(self.columns)}
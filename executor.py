@@ -0,0 +1,197 @@
+import asyncio
+import hashlib
+import logging
+import time
+from collections import deque
+import strategy
+from http_client import OkxAsyncClient, OkxAPIError, OKX_BASE_URL
+
+MAX_CONCURRENT_ORDERS = 200
+CONTRACT_VALUE = 1.0  # SOL per SOL-USDT-SWAP contract
+TD_MODE = "cross"
+LATENCY_HISTORY = 1000
+# A submit whose outcome is unknown (timeout, dropped connection) is looked up by clOrdId before it is retried
+# or given up on; the same clOrdId makes the retry safe
+SUBMIT_ATTEMPTS = 2
+LOOKUP_ATTEMPTS = 3
+LOOKUP_DELAY = 0.5
+# Market orders normally fill before the first lookup; a still-live order is polled this many more times
+FILL_POLLS = 5
+ORDER_NOT_FOUND = "51603"
+DUPLICATE_CLORDID = "51016"
+FINAL_STATES = ("filled", "canceled", "mmp_canceled")
+
+def error_code(error):
+    # OKX answers a rejected order with code "1" and the reason in data[0].sCode / sMsg
+    data = error.response.get('data') or [{}]
+    return data[0].get('sCode') or error.response.get('code')
+
+def error_message(error):
+    data = error.response.get('data') or [{}]
+    return data[0].get('sMsg') or str(error)
+
+def client_order_id(signal_id):
+    # OKX clOrdId: alphanumeric, up to 32 chars, unique per account; one per signal so a retry cannot double-fill
+    return "".join(ch for ch in f"gbt{signal_id}" if ch.isalnum())[:32]
+
+class ExecutionEngine:
+    def __init__(self, inst_id=strategy.instId, base_url=OKX_BASE_URL, flag='0', max_concurrent=MAX_CONCURRENT_ORDERS):
+        self.inst_id = inst_id
+        self.base_url = base_url
+        self.flag = flag
+        self.clients = {}
+        self.latencies = deque(maxlen=LATENCY_HISTORY)
+        self.last_fanout = None
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+
+    def client_for(self, chat_id, api_key, api_secret, api_pass):
+        # Authenticated clients are cached per user and rebuilt only when the credentials change
+        fingerprint = hashlib.sha256(f"{api_key}:{api_secret}:{api_pass}".encode()).hexdigest()
+        cached = self.clients.get(chat_id)
+        if cached is None or cached[0] != fingerprint:
+            cached = (fingerprint, OkxAsyncClient(api_key, api_secret, api_pass, flag=self.flag, base_url=self.base_url))
+            self.clients[chat_id] = cached
+        return cached[1]
+
+    def invalidate(self, chat_id):
+        self.clients.pop(chat_id, None)
+
+    async def open_positions(self, users, side, price, signal_id):
+        # users: iterable of (chat_id, trade_size, api_key, api_secret, api_pass)
+        orders = []
+        for chat_id, trade_size, api_key, api_secret, api_pass in users:
+            size_sol = strategy.order_size(trade_size, price)
+            if size_sol <= 0:
+                logging.info(f"Skipping {chat_id}: trade size {trade_size} USDT is below one lot")
+                continue
+            orders.append((chat_id, (api_key, api_secret, api_pass), size_sol,
+                           {"side": "buy" if side == "long" else "sell"}, signal_id))
+        return await self._fan_out(orders, signal_id)
+
+    async def close_positions(self, positions, signal_id):
+        # positions: iterable of (chat_id, side, size_sol, api_key, api_secret, api_pass, close_id). close_id is
+        # the position's own signal id, the same on every retry of its exit; signal_id only labels the fan-out
+        orders = [(chat_id, (api_key, api_secret, api_pass), size_sol,
+                   {"side": "sell" if side == "long" else "buy", "reduceOnly": "true"}, close_id)
+                  for chat_id, side, size_sol, api_key, api_secret, api_pass, close_id in positions]
+        return await self._fan_out(orders, signal_id)
+
+    async def find_fill(self, chat_id, credentials, signal_id):
+        # (size_sol, avgPx) filled by the order placed for signal_id; None when there is no such order, it did
+        # not fill, or OKX cannot be reached
+        order = await self._find_order(self.client_for(chat_id, *credentials), client_order_id(signal_id))
+        filled = float((order or {}).get('accFillSz') or 0)
+        if filled <= 0:
+            return None
+        return round(filled * CONTRACT_VALUE / strategy.leverage, 8), float(order['avgPx'])
+
+    async def _fan_out(self, orders, signal_id):
+        # Every order is signed and in flight before the first ack comes back
+        started = time.perf_counter()
+        results = await asyncio.gather(*(self._submit(order, started) for order in orders))
+        acked = [result["ack_offset_ms"] for result in results if result["ok"]]
+        self.last_fanout = {
+            "signal_id": signal_id,
+            "orders": len(results),
+            "failed": sum(1 for result in results if not result["ok"]),
+            "skew_ms": (max(acked) - min(acked)) if acked else 0.0,
+            "total_ms": (time.perf_counter() - started) * 1000,
+        }
+        logging.info(f"Fan-out {signal_id}: {self.last_fanout}")
+        return results
+
+    async def _submit(self, order, started):
+        # ok only for an order OKX reports as (at least partly) filled; fill_price and size_sol are the fill's.
+        # code is OKX's error code when the exchange rejected the order
+        chat_id, credentials, size_sol, params, signal_id = order
+        client = self.client_for(chat_id, *credentials)
+        contracts = size_sol * strategy.leverage / CONTRACT_VALUE
+        cl_ord_id = client_order_id(signal_id)
+        result = {"chat_id": chat_id, "size_sol": size_sol, "ok": False, "ord_id": None, "fill_price": None,
+                  "code": None, "error": None}
+        async with self._semaphore:
+            submitted = time.perf_counter()
+            found = None
+            for attempt in range(SUBMIT_ATTEMPTS):
+                try:
+                    response = await client.place_order(self.inst_id, TD_MODE, ordType="market", sz=f"{contracts:g}",
+                                                        clOrdId=cl_ord_id, **params)
+                    result["ord_id"] = response['data'][0].get('ordId')
+                    break
+                except OkxAPIError as e:
+                    result["code"] = error_code(e)
+                    result["error"] = error_message(e)
+                    if result["code"] != DUPLICATE_CLORDID:
+                        break
+                    # An earlier attempt did reach OKX
+                    found = await self._find_order(client, cl_ord_id)
+                    break
+                except Exception as e:
+                    result["error"] = str(e)
+                    logging.error(f"Order for {chat_id} failed ({str(e)}), looking it up by clOrdId {cl_ord_id}")
+                    found = await self._find_order(client, cl_ord_id)
+                    if found != {}:
+                        break
+                    # OKX never saw it: safe to submit again with the same clOrdId
+            acked = time.perf_counter()
+            if result["ord_id"] is not None or found:
+                result["code"] = result["error"] = None
+                found = await self._await_fill(client, cl_ord_id, found)
+                if found is None:
+                    # Accepted but the fill cannot be read back: a market order is as good as filled, so the
+                    # position is managed at the requested size (and the caller's price) rather than left unwatched
+                    logging.warning(f"Fill of {cl_ord_id} for {chat_id} unknown; assuming the requested size")
+                    result["ok"] = True
+                else:
+                    filled = float(found.get('accFillSz') or 0)
+                    result["ord_id"] = found.get('ordId', result["ord_id"])
+                    if filled > 0:
+                        result["ok"] = True
+                        result["size_sol"] = round(filled * CONTRACT_VALUE / strategy.leverage, 8)
+                        result["fill_price"] = float(found['avgPx'])
+                    else:
+                        result["error"] = f"order {found.get('state', 'unknown')} without a fill"
+            elif found is None and result["code"] is None:
+                result["error"] = f"order status unknown ({result['error']}); check OKX for clOrdId {cl_ord_id}"
+            if not result["ok"]:
+                logging.error(f"Order for {chat_id} failed: {result['error']}")
+        result["latency_ms"] = (acked - submitted) * 1000
+        result["ack_offset_ms"] = (acked - started) * 1000
+        self.latencies.append(result["latency_ms"])
+        return result
+
+    async def _find_order(self, client, cl_ord_id):
+        # The order as OKX knows it; {} when OKX says it does not exist, None when it cannot tell us
+        for attempt in range(LOOKUP_ATTEMPTS):
+            try:
+                return (await client.get_order(self.inst_id, clOrdId=cl_ord_id))['data'][0]
+            except OkxAPIError as e:
+                if error_code(e) == ORDER_NOT_FOUND:
+                    return {}
+                logging.error(f"Order lookup {cl_ord_id} failed: {str(e)}")
+            except Exception as e:
+                logging.error(f"Order lookup {cl_ord_id} failed: {str(e)}")
+            if attempt < LOOKUP_ATTEMPTS - 1:
+                await asyncio.sleep(LOOKUP_DELAY * 2 ** attempt)
+        return None
+
+    async def _await_fill(self, client, cl_ord_id, order=None):
+        # Final state of an accepted order (None if it cannot be read); the ack itself carries no fill price
+        for poll in range(FILL_POLLS + 1):
+            if order and order.get('state') in FINAL_STATES:
+                return order
+            if poll:
+                await asyncio.sleep(LOOKUP_DELAY)
+            found = await self._find_order(client, cl_ord_id)
+            if found is None:
+                # Unreachable even after _find_order's retries
+                break
+            order = found or order
+        return order or None
+
+    def latency_stats(self):
+        if not self.latencies:
+            return {}
+        ordered = sorted(self.latencies)
+        return {"count": len(ordered), "p50_ms": ordered[len(ordered) // 2],
+                "p99_ms": ordered[int(len(ordered) * 0.99)], "max_ms": ordered[-1], "last_fanout": self.last_fanout}
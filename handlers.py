@@ -0,0 +1,295 @@
+import math
+from datetime import datetime, timedelta
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
+from telegram.ext import ContextTypes
+import storage
+from storage import get_user, update_user
+from http_client import get_tron_tx
+import trading
+from trading import (TIMEZONE, position_states, trades, trading_active, latest_trade,
+                     send_telegram_alert, pin_latest_trade)
+
+# Constants
+OKX_REFERRAL_LINK = "https://www.okx.com/join/43051887"
+USDT_TRC20_ADDRESS = "TWVQnJJd8S1Kb6DXhNhsaREcMrYunUtswA"
+SUPPORT_EMAIL = "goodboytrader_client_123@yahoo.com"
+
+# Global State
+pending_verifications = {}
+
+# Referral Functions
+def generate_referral_code(chat_id):
+    return f"GBT{chat_id[-6:]}"
+
+def add_referral(referrer_id, referee_id):
+    storage.add_referral_row(referrer_id, referee_id)
+    trading.broadcaster.send(referrer_id,
+        f"🐶 Woof! Your friend (ID: {referee_id[-6:]}) joined with your code! Earn 1% of their profits when they subscribe!")
+
+async def monthly_payout(context: ContextTypes.DEFAULT_TYPE):
+    # Pays every unpaid month before the current one; the startup catch-up run skips wallet reminders
+    remind = context.job.data.get("remind", True) if context.job and context.job.data else True
+    current_month = datetime.now(TIMEZONE).strftime('%Y-%m')
+    earnings = {}
+    for referrer_id, month, profit in storage.unpaid_referral_months(current_month):
+        if not trading.owns(referrer_id):
+            continue
+        earnings.setdefault(referrer_id, []).append((month, profit))
+    for referrer_id, months in earnings.items():
+        total_profit = sum(profit for _, profit in months)
+        wallet = get_user(referrer_id).wallet
+        if wallet:
+            await send_telegram_alert(referrer_id,
+                f"💰 Referral Payout! You earned {total_profit:.2f} USDT from your invitees last month!\n"
+                f"Sent to: {wallet}\n"
+                f"Update wallet: /setwallet <USDT_TRC20_address>")
+            for month, _ in months:
+                storage.mark_referral_month_paid(referrer_id, month)
+        elif remind:
+            await send_telegram_alert(referrer_id,
+                f"💰 Referral Payout! You earned {total_profit:.2f} USDT from your invitees last month!\n"
+                f"Set a wallet to claim: /setwallet <USDT_TRC20_address>")
+
+async def verify_tron_tx(txid, amount):
+    try:
+        response = await get_tron_tx(txid)
+        return (response.get('contractData', {}).get('to_address') == USDT_TRC20_ADDRESS and 
+                float(response.get('contractData', {}).get('amount', 0)) / 10**6 == amount and 
+                response.get('confirmed'))
+    except:
+        return False
+
+# Telegram Handlers
+async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = str(update.message.chat_id)
+    referral_code = generate_referral_code(chat_id)
+    referred_by = context.args[0] if context.args else None
+
+    if referred_by and referred_by.startswith("GBT"):
+        referrer_id = storage.find_referrer(referred_by)
+        if referrer_id:
+            add_referral(referrer_id, chat_id)
+
+    user = get_user(chat_id)
+    tier, trade_size, total_pnl, sub_expiry, api_key = user.tier, user.trade_size, user.pnl, user.sub_expiry, user.api_key
+    referral_link = f"https://t.me/GoodBoyTraderBot?start={referral_code}"
+
+    # Safely handle latest_trade with None checks
+    entry_price, exit_price, trade_pnl_text = (f"{latest_trade[key]:.2f}" if latest_trade[key] is not None else 'N/A'
+                                               for key in ('entry_price', 'exit_price', 'pnl'))
+    trade_msg = (
+        f"📈 *Latest Trade*\n"
+        f"Time: {latest_trade['time'].strftime('%Y-%m-%d %H:%M') if latest_trade['time'] is not None else 'N/A'}\n"
+        f"Side: {latest_trade['side'].capitalize() if latest_trade['side'] is not None else 'None'}\n"
+        f"Entry: {entry_price} USDT | "
+        f"Exit: {exit_price} USDT\n"
+        f"PnL: {trade_pnl_text} USDT\n\n"
+    )
+
+    if tier in ["free", "trial_expired"]:
+        keyboard = [
+            [InlineKeyboardButton("📊 PnL", callback_data='pnl'),
+             InlineKeyboardButton("🎁 Free Trial", callback_data='freetrial')],
+            [InlineKeyboardButton("⭐ Standard", callback_data='standard'),
+             InlineKeyboardButton("🌟 Elite", callback_data='elite')],
+            [InlineKeyboardButton("👥 Referrals", callback_data='referrals'),
+             InlineKeyboardButton("📞 Support", callback_data='support')]
+        ]
+        reply_markup = InlineKeyboardMarkup(keyboard)
+        days_left = (datetime.fromisoformat(sub_expiry) - datetime.now(TIMEZONE)).days if sub_expiry else 14
+        dashboard_msg = (
+            f"🐶 *Trade While You Sleep, Wake Up with a Smile – GoodBoyTrader’s Got You!*\n\n"
+            f"Welcome to the first sophisticated trading bot that analyzes every move before pouncing!\n"
+            f"✅ *92% Proven Success* from 5-Month Backtests!\n"
+            f"📈 Trading *SOL-USDT-SWAP* on OKX now – Tier-1 exchanges (Binance, Bybit) coming soon!\n"
+            f"🎁 *14-Day Free Trial*: See our biggest wins!\n"
+            f"{trade_msg}"
+            f"🔹 *Tier*: {tier.capitalize()} | *Trial Days Left*: {days_left}/14\n"
+            f"💰 *PnL*: {total_pnl:.2f} USDT\n"
+            f"👥 *Refer & Earn*: Invite friends with this link: {referral_link}\n"
+            f"   - Earn 1% of their profits monthly when they subscribe! Check /referrals\n\n"
+            f"🔧 *Choose Your Tier*:\n"
+            f"   *Standard ($40/mo)*: Unlock 100–500 USDT trade size on 5x leverage, basic auto-trading with EMA signals (4H & 15m), predefined stop-loss & trailing stops, 5% profit cut.\n"
+            f"      Start Now: /standard\n"
+            f"   *Elite ($75/mo)*: Unlock 500–5,000 USDT trade size on 5x leverage, all Standard features plus custom TP (/settp), detailed 15-min signal updates, 3% profit cut, priority support.\n"
+            f"      Start Now: /elite\n\n"
+            f"🆕 New? Try /freetrial | Navigate below!"
+        )
+        if tier == "trial_expired" or (sub_expiry and datetime.now(TIMEZONE) > datetime.fromisoformat(sub_expiry)):
+            update_user(chat_id, "free", 0, expiry=(datetime.now(TIMEZONE) + timedelta(days=14)).isoformat(), referral_code=referral_code, referred_by=referred_by)
+            await update.message.reply_text(f"🎉 *Trial Reset!* {dashboard_msg}", reply_markup=reply_markup, parse_mode='Markdown')
+        else:
+            update_user(chat_id, "free", 0, expiry=(datetime.now(TIMEZONE) + timedelta(days=14)).isoformat(), referral_code=referral_code, referred_by=referred_by)
+            await update.message.reply_text(dashboard_msg, reply_markup=reply_markup, parse_mode='Markdown')
+    else:
+        keyboard = [
+            [InlineKeyboardButton("📊 PnL", callback_data='pnl'),
+             InlineKeyboardButton("🔍 Status", callback_data='status')],
+            [InlineKeyboardButton("📜 History", callback_data='history'),
+             InlineKeyboardButton("👥 Referrals", callback_data='referrals')],
+            [InlineKeyboardButton("📞 Support", callback_data='support')]
+        ]
+        reply_markup = InlineKeyboardMarkup(keyboard)
+        expiry_days = (datetime.fromisoformat(sub_expiry) - datetime.now(TIMEZONE)).days if sub_expiry else 0
+        dashboard_msg = (
+            f"🐶 *Trade While You Sleep, Wake Up with a Smile – GoodBoyTrader’s Got You!*\n\n"
+            f"🌟 *VIP Dashboard*\n"
+            f"🔹 *Tier*: {tier.capitalize()} | *Expires in*: {expiry_days} days\n"
+            f"💸 *Trade Size*: {trade_size} USDT @ 5x Leverage\n"
+            f"🔑 *API*: {'Set' if api_key else 'Not Set'} (Update: /setapi)\n"
+            f"{trade_msg}"
+            f"💰 *PnL*: {total_pnl:.2f} USDT\n"
+            f"👥 *Refer & Earn*: Invite friends with this link: {referral_link}\n"
+            f"   - Earn 1% of their profits monthly! Check /referrals\n\n"
+            f"🤖 *Auto-Trading*: /starttrading | /stoptrading\n"
+            f"🔧 *Manage your trades below!*"
+        )
+        await update.message.reply_text(dashboard_msg, reply_markup=reply_markup, parse_mode='Markdown')
+        await pin_latest_trade(chat_id)
+
+async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+    chat_id = str(query.message.chat_id)
+    if query.data == 'pnl':
+        await pnl(update, context)
+    elif query.data == 'freetrial':
+        await freetrial(update, context)
+    elif query.data == 'standard':
+        await standard(update, context)
+    elif query.data == 'elite':
+        await elite(update, context)
+    elif query.data == 'referrals':
+        await referrals(update, context)
+    elif query.data == 'support':
+        await support(update, context)
+    elif query.data == 'status':
+        await status(update, context)
+    elif query.data == 'history':
+        await history(update, context)
+
+async def referrals(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = str(update.effective_chat.id) if update.callback_query else str(update.message.chat_id)
+    valid_refs, total_profit = storage.referral_stats(chat_id)
+    keyboard = [[InlineKeyboardButton("🔙 Back to Dashboard", callback_data='start')]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    referral_msg = (
+        f"👥 *Your Referral Stats*\n\n"
+        f"✅ *Valid Invitees*: {valid_refs} (Subscribed VIPs)\n"
+        f"💰 *Total Earnings*: {total_profit:.2f} USDT\n\n"
+        f"📎 Invite more with your link: https://t.me/GoodBoyTraderBot?start={generate_referral_code(chat_id)}\n"
+        f"💸 Earn 1% of their profits monthly when they subscribe!"
+    )
+    await (update.callback_query.message.reply_text if update.callback_query else update.message.reply_text)(
+        referral_msg, reply_markup=reply_markup, parse_mode='Markdown'
+    )
+
+async def pnl(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = str(update.effective_chat.id) if update.callback_query else str(update.message.chat_id)
+    total_pnl = get_user(chat_id).pnl
+    tracker = trading.tracker_for(chat_id)
+    keyboard = [[InlineKeyboardButton("🔙 Back to Dashboard", callback_data='start')]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await (update.callback_query.message.reply_text if update.callback_query else update.message.reply_text)(
+        f"📊 *VIP PnL Report*\n\n"
+        f"💰 *Total PnL*: {total_pnl:.2f} USDT\n"
+        f"✅ *Wins*: {tracker.wins}\n"
+        f"❌ *Losses*: {tracker.losses}\n"
+        f"📈 *Total Trades*: {tracker.trade_count}",
+        reply_markup=reply_markup,
+        parse_mode='Markdown'
+    )
+
+async def status(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = str(update.effective_chat.id) if update.callback_query else str(update.message.chat_id)
+    user = get_user(chat_id)
+    tier, trade_size = user.tier, user.trade_size
+    pos = position_states.get(chat_id, "None")
+    active = trading_active.get(chat_id, False)
+    trade = trades.get(chat_id, {})
+    status_msg = (
+        f"🔍 *VIP Status*\n\n"
+        f"🔹 *Tier*: {tier.capitalize()}\n"
+        f"💸 *Trade Size*: {trade_size} USDT\n"
+        f"📊 *Position*: {pos if pos != 'closing' else 'Closing'}"
+    )
+    if pos in ["long", "short"]:
+        status_msg += f" at {trade['entry_price']:.2f}"
+    status_msg += f"\n🔧 *Trading*: {'Active' if active else 'Stopped'}"
+    keyboard = [[InlineKeyboardButton("🔙 Back to Dashboard", callback_data='start')]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await (update.callback_query.message.reply_text if update.callback_query else update.message.reply_text)(
+        status_msg, reply_markup=reply_markup, parse_mode='Markdown'
+    )
+
+async def starttrading(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = str(update.message.chat_id)
+    user = get_user(chat_id)
+    keyboard = [[InlineKeyboardButton("🔙 Back to Dashboard", callback_data='start')]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    if user.tier not in storage.PAID_TIERS:
+        msg = "🔒 *Auto-trading is for Standard and Elite members.* Upgrade: /standard or /elite"
+    elif not user.api_key or not user.trade_size:
+        msg = "🔑 *Set your OKX API keys (/setapi) and trade size (/setsize) first.*"
+    else:
+        trading.set_trading_active(chat_id, True)
+        msg = f"✅ *Trading Started!* Next signal opens {user.trade_size} USDT @ 5x Leverage. Stop anytime: /stoptrading"
+    await update.message.reply_text(msg, reply_markup=reply_markup, parse_mode='Markdown')
+
+async def stoptrading(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = str(update.message.chat_id)
+    trading.set_trading_active(chat_id, False)
+    keyboard = [[InlineKeyboardButton("🔙 Back to Dashboard", callback_data='start')]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await update.message.reply_text(
+        "🛑 *Trading Stopped!* No new positions will open; an open position still exits as planned. Resume: /starttrading",
+        reply_markup=reply_markup,
+        parse_mode='Markdown'
+    )
+
+async def settp(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = str(update.message.chat_id)
+    keyboard = [[InlineKeyboardButton("🔙 Back to Dashboard", callback_data='start')]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    arg = context.args[0].lower() if context.args else None
+    try:
+        tp = None if arg == "off" else float(arg)
+    except (TypeError, ValueError):
+        tp = math.nan
+    error = trading.custom_tp_error(chat_id, tp)
+    if get_user(chat_id).tier != "elite":
+        msg = "🔒 *Custom TP is an Elite feature.* Upgrade: /elite"
+    elif tp is not None and not (math.isfinite(tp) and tp > 0):
+        msg = "🎯 Usage: /settp <price> or /settp off"
+    elif error:
+        msg = f"⚠️ *Custom TP not set*: {error}."
+    else:
+        trading.set_custom_tp(chat_id, tp)
+        msg = f"🎯 *Custom TP*: {f'{tp:.2f} USDT' if tp is not None else 'Off'}"
+        if tp is not None and chat_id not in trading.position_monitor:
+            msg += " (applies to your next position if it lies on its profit side)"
+    await update.message.reply_text(msg, reply_markup=reply_markup, parse_mode='Markdown')
+
+async def history(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = str(update.message.chat_id)
+    trade_list = storage.recent_trades(chat_id, 5)
+    if not trade_list:
+        keyboard = [[InlineKeyboardButton("🔙 Back to Dashboard", callback_data='start')]]
+        reply_markup = InlineKeyboardMarkup(keyboard)
+        await update.message.reply_text(
+            f"📜 *VIP Trade History*\n\n"
+            f"📉 *No trades yet!* Start trading with /setsize after upgrading.",
+            reply_markup=reply_markup,
+            parse_mode='Markdown'
+        )
+        return
+    history_msg = f"📜 *VIP Trade History (Last 5)*\n\n"
+    for t in trade_list:
+        history_msg += (
+            f"🕒 {t[0]} | {t[4].capitalize()}\n"
+            f"   In: {t[1]:.2f} | Out: {t[3]:.2f}\n"
+            f"   PnL: {t[5]:.2f} USDT\n\n"
+        )
+    keyboard = [[InlineKeyboardButton("🔙 Back to Dashboard", callback_data='start')]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await update.message.reply_text(history_msg.strip(), reply_markup=reply_markup, parse_mode='Markdown')
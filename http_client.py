@@ -0,0 +1,264 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import random
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+import httpx
+import metrics
+from ratelimit import TokenBucket
+
+OKX_BASE_URL = "https://www.okx.com"
+TRONSCAN_BASE_URL = "https://api.tronscan.org"
+POOL_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=30)
+ENDPOINT_TIMEOUTS = {
+    "market": httpx.Timeout(5.0, connect=3.0),
+    "history": httpx.Timeout(5.0, connect=3.0),
+    "trade": httpx.Timeout(3.0, connect=2.0),
+    "account": httpx.Timeout(5.0, connect=3.0),
+    "funding": httpx.Timeout(10.0, connect=3.0),
+    "tronscan": httpx.Timeout(10.0, connect=3.0),
+}
+# (requests per second, burst) shared by everything in the process; OKX limits public market data per IP
+# (40 per 2 s), history-candles separately and lower (20 per 2 s)
+RATE_LIMITS = {"market": (20, 40), "history": (10, 20)}
+# A 429 pauses the group's limiter this long (or for the server's Retry-After) and the GET is retried
+RATE_LIMIT_BACKOFF = 1.0
+RATE_LIMIT_RETRIES = 3
+BREAKER_THRESHOLD = 5
+BREAKER_RESET = 30.0
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 10.0
+
+class OkxAPIError(Exception):
+    def __init__(self, response):
+        self.response = response
+        super().__init__(f"API error: {response.get('msg', 'Unknown')} (code {response.get('code')})")
+
+class CircuitOpenError(Exception):
+    pass
+
+breaker_open = metrics.gauge("circuit_breaker_open", "1 while an endpoint group's circuit breaker is open")
+
+class CircuitBreaker:
+    # closed -> open after `threshold` consecutive failures; one trial call allowed after `reset_timeout`
+    def __init__(self, name, threshold=BREAKER_THRESHOLD, reset_timeout=BREAKER_RESET):
+        self.name = name
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.reset_timeout else "open"
+
+    def allow(self):
+        # True when this call is the half-open trial; the caller must release() it however the call ends
+        state = self.state
+        if state == "closed":
+            return False
+        if state == "half-open" and not self.trial_running:
+            self.trial_running = True
+            return True
+        raise CircuitOpenError(f"Circuit '{self.name}' is open")
+
+    def release(self):
+        # A trial that ended without an outcome (cancelled) lets the next call try instead
+        self.trial_running = False
+
+    def record_success(self):
+        if self.opened_at is not None:
+            breaker_open.set(0, group=self.name)
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_running = False
+        if self.opened_at is not None or self.failures >= self.threshold:
+            if self.opened_at is None:
+                logging.error(f"Circuit '{self.name}' opened after {self.failures} failures")
+                breaker_open.set(1, group=self.name)
+            self.opened_at = time.monotonic()
+
+breakers = {name: CircuitBreaker(name) for name in ENDPOINT_TIMEOUTS}
+
+# Shared connection pool
+_http_client = None
+_rate_limiters = {}
+
+def get_http_client():
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(limits=POOL_LIMITS, headers={"Content-Type": "application/json"})
+    return _http_client
+
+async def close_http_client():
+    global _http_client
+    _rate_limiters.clear()
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+async def fetch_with_retries_async(api_call, max_attempts=3, base_delay=RETRY_BASE_DELAY):
+    # Jittered backoff that never blocks the event loop; None once the attempts are used up or the breaker is open
+    for attempt in range(max_attempts):
+        try:
+            return await api_call()
+        except CircuitOpenError as e:
+            logging.error(f"Attempt {attempt + 1} skipped: {str(e)}")
+            return None
+        except Exception as e:
+            logging.error(f"Attempt {attempt + 1} failed likewise: {str(e)}")
+            if attempt < max_attempts - 1:
+                metrics.okx_retries_total.inc(call="fetch_with_retries_async")
+                await asyncio.sleep(random.uniform(0, min(RETRY_MAX_DELAY, base_delay * 2 ** attempt)))
+    return None
+
+def rate_limiter(group):
+    # Created on first use so the bucket belongs to the running event loop
+    if group in RATE_LIMITS and group not in _rate_limiters:
+        _rate_limiters[group] = TokenBucket(*RATE_LIMITS[group])
+    return _rate_limiters.get(group)
+
+def _retry_after(response, attempt):
+    try:
+        return max(0.0, float(response.headers["retry-after"]))
+    except (KeyError, ValueError):
+        return RATE_LIMIT_BACKOFF * 2 ** attempt
+
+async def _request(group, method, url, client=None, **kwargs):
+    breaker = breakers[group]
+    trial = breaker.allow()
+    try:
+        limiter = rate_limiter(group)
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            if limiter is not None:
+                await limiter.acquire()
+            started = time.perf_counter()
+            try:
+                response = await (client or get_http_client()).request(method, url, timeout=ENDPOINT_TIMEOUTS[group], **kwargs)
+            except Exception as e:
+                metrics.http_request_seconds.observe(time.perf_counter() - started, group=group, status=type(e).__name__)
+                breaker.record_failure()
+                raise
+            metrics.http_request_seconds.observe(time.perf_counter() - started, group=group, status=response.status_code)
+            if response.status_code != 429:
+                break
+            # Rate limited: OKX is up, so the breaker is left alone; the group backs off and a GET is retried
+            delay = _retry_after(response, attempt)
+            logging.warning(f"Rate limited on '{group}', backing off {delay:.1f}s")
+            metrics.okx_retries_total.inc(call=f"rate_limited_{group}")
+            if limiter is not None:
+                limiter.pause(delay)
+            if method != "GET" or attempt == RATE_LIMIT_RETRIES:
+                break
+            if limiter is None:
+                await asyncio.sleep(delay)
+        # Only upstream trouble trips the breaker; a user's bad request or credentials do not
+        if response.status_code >= 500:
+            breaker.record_failure()
+        elif response.status_code != 429:
+            breaker.record_success()
+    finally:
+        # CancelledError is not an Exception: without this a cancelled trial would keep the breaker open for good
+        if trial:
+            breaker.release()
+    if response.status_code >= 400 and not response.headers.get("content-type", "").startswith("application/json"):
+        response.raise_for_status()
+    return response
+
+# OKX REST (same method names and response shape as the okx SDK)
+class OkxAsyncClient:
+    def __init__(self, api_key='', api_secret='', passphrase='', flag='0', base_url=OKX_BASE_URL, client=None):
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.passphrase = passphrase
+        self.flag = flag
+        self.base_url = base_url.rstrip("/")
+        self.client = client
+
+    def _headers(self, method, path, body):
+        headers = {"x-simulated-trading": "1"} if self.flag == '1' else {}
+        if not self.api_key:
+            return headers
+        timestamp = datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+        digest = hmac.new(self.api_secret.encode(), f"{timestamp}{method}{path}{body}".encode(), hashlib.sha256).digest()
+        headers.update({
+            "OK-ACCESS-KEY": self.api_key,
+            "OK-ACCESS-SIGN": base64.b64encode(digest).decode(),
+            "OK-ACCESS-TIMESTAMP": timestamp,
+            "OK-ACCESS-PASSPHRASE": self.passphrase,
+        })
+        return headers
+
+    async def _call(self, group, method, path, params=None):
+        params = {key: value for key, value in (params or {}).items() if value not in ('', None)}
+        body = ''
+        if method == "GET" and params:
+            path = f"{path}?{urlencode(params)}"
+        elif method == "POST":
+            body = json.dumps(params)
+        response = await _request(group, method, f"{self.base_url}{path}", client=self.client,
+                                  headers=self._headers(method, path, body), content=body or None)
+        data = response.json()
+        if data.get('code') != '0':
+            raise OkxAPIError(data)
+        return data
+
+    # MarketData
+    async def get_candlesticks(self, instId, after='', before='', bar='', limit=''):
+        return await self._call("market", "GET", "/api/v5/market/candles",
+                                {"instId": instId, "after": after, "before": before, "bar": bar, "limit": limit})
+
+    async def get_history_candlesticks(self, instId, after='', before='', bar='', limit=''):
+        return await self._call("history", "GET", "/api/v5/market/history-candles",
+                                {"instId": instId, "after": after, "before": before, "bar": bar, "limit": limit})
+
+    async def get_ticker(self, instId):
+        return await self._call("market", "GET", "/api/v5/market/ticker", {"instId": instId})
+
+    # Trade
+    async def place_order(self, instId, tdMode, side, ordType, sz, posSide='', px='', clOrdId='', reduceOnly=''):
+        return await self._call("trade", "POST", "/api/v5/trade/order",
+                                {"instId": instId, "tdMode": tdMode, "side": side, "ordType": ordType, "sz": sz,
+                                 "posSide": posSide, "px": px, "clOrdId": clOrdId, "reduceOnly": reduceOnly})
+
+    async def cancel_order(self, instId, ordId='', clOrdId=''):
+        return await self._call("trade", "POST", "/api/v5/trade/cancel-order",
+                                {"instId": instId, "ordId": ordId, "clOrdId": clOrdId})
+
+    async def get_order(self, instId, ordId='', clOrdId=''):
+        return await self._call("trade", "GET", "/api/v5/trade/order", {"instId": instId, "ordId": ordId, "clOrdId": clOrdId})
+
+    # Account
+    async def get_account_balance(self, ccy=''):
+        return await self._call("account", "GET", "/api/v5/account/balance", {"ccy": ccy})
+
+    async def get_positions(self, instType='', instId=''):
+        return await self._call("account", "GET", "/api/v5/account/positions", {"instType": instType, "instId": instId})
+
+    async def set_leverage(self, lever, mgnMode, instId='', ccy='', posSide=''):
+        return await self._call("account", "POST", "/api/v5/account/set-leverage",
+                                {"lever": lever, "mgnMode": mgnMode, "instId": instId, "ccy": ccy, "posSide": posSide})
+
+    # Funding
+    async def get_balances(self, ccy=''):
+        return await self._call("funding", "GET", "/api/v5/asset/balances", {"ccy": ccy})
+
+    async def get_deposit_history(self, ccy='', txId='', limit=''):
+        return await self._call("funding", "GET", "/api/v5/asset/deposit-history", {"ccy": ccy, "txId": txId, "limit": limit})
+
+# Tronscan
+async def get_tron_tx(txid, base_url=TRONSCAN_BASE_URL, client=None):
+    response = await _request("tronscan", "GET", f"{base_url}/api/transaction/{txid}", client=client)
+    return response.json()
@@ -0,0 +1,91 @@
+import math
+
+# Incremental indicators matching ta.trend.ema_indicator / ta.volatility.average_true_range
+class EMA:
+    def __init__(self, window):
+        self.window = window
+        self.alpha = 2.0 / (window + 1)
+        self.value = None
+        self.count = 0
+
+    def _next(self, close):
+        if self.value is None:
+            return close
+        return (1 - self.alpha) * self.value + self.alpha * close
+
+    def update(self, close):
+        self.value = self._next(close)
+        self.count += 1
+        return self.current()
+
+    def peek(self, close):
+        return self._next(close) if self.count + 1 >= self.window else math.nan
+
+    def current(self):
+        return self.value if self.count >= self.window else math.nan
+
+class ATR:
+    def __init__(self, window=14):
+        self.window = window
+        self.prev_close = None
+        self.count = 0
+        self.tr_sum = 0.0
+        self.value = 0.0
+
+    def _true_range(self, high, low):
+        if self.prev_close is None:
+            return high - low
+        return max(high - low, abs(high - self.prev_close), abs(low - self.prev_close))
+
+    def _next(self, high, low):
+        tr = self._true_range(high, low)
+        count = self.count + 1
+        if count < self.window:
+            return tr, 0.0
+        if count == self.window:
+            return tr, (self.tr_sum + tr) / self.window
+        return tr, (self.value * (self.window - 1) + tr) / float(self.window)
+
+    def update(self, high, low, close):
+        tr, self.value = self._next(high, low)
+        self.count += 1
+        if self.count <= self.window:
+            self.tr_sum += tr
+        self.prev_close = close
+        return self.value
+
+    def peek(self, high, low):
+        return self._next(high, low)[1]
+
+class IndicatorEngine:
+    def __init__(self, ema_periods=(5, 20, 100), atr_window=14):
+        self.emas = {f"ema_{period}": EMA(period) for period in ema_periods}
+        self.atr = ATR(atr_window)
+        self.last_ts = None
+        self.last_close = None
+
+    @property
+    def columns(self):
+        return list(self.emas) + ["atr"]
+
+    def update(self, ts, high, low, close):
+        # Confirmed candle: advances state in O(1)
+        values = {name: ema.update(close) for name, ema in self.emas.items()}
+        values["atr"] = self.atr.update(high, low, close)
+        self.last_ts = ts
+        self.last_close = close
+        return values
+
+    def peek(self, high, low, close):
+        # Unconfirmed candle: values as if it closed now, state untouched
+        values = {name: ema.peek(close) for name, ema in self.emas.items()}
+        values["atr"] = self.atr.peek(high, low)
+        return values
+
+    def seed(self, candles):
+        return [self.update(ts, high, low, close) for ts, high, low, close in candles]
+
+    def current(self):
+        values = {name: ema.current() for name, ema in self.emas.items()}
+        values["atr"] = self.atr.value
+        return values
@@ -0,0 +1,211 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+import metrics
+
+# Append-only journal of in-memory trading state with periodic compact snapshots. Every record is an absolute
+# [table, key, value] (or [table, key] for a delete), so replaying records that a snapshot already covers is
+# harmless and recovery is: snapshot, then the rotated journal (if a snapshot was in progress), then the journal.
+STATE_DIR = os.getenv("GOODBOY_STATE", "state")
+# Seconds between fsyncs of the journal; records reach the OS on every write, so only a host crash can lose them
+FSYNC_INTERVAL = 1.0
+
+append_seconds = metrics.histogram("journal_append_seconds", "State journal append latency",
+                                   buckets=(0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.001, 0.005))
+snapshot_seconds = metrics.histogram("journal_snapshot_seconds", "State snapshot write time")
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {"$dt": value.isoformat()}
+    raise TypeError(f"Cannot journal {type(value).__name__}")
+
+# Built once: json.dumps(default=...) would construct a new encoder per record
+_encoder = json.JSONEncoder(default=_encode, separators=(",", ":"))
+
+def _decode(obj):
+    return datetime.fromisoformat(obj["$dt"]) if len(obj) == 1 and "$dt" in obj else obj
+
+class StateJournal:
+    def __init__(self, name="state", directory=STATE_DIR):
+        self.name = name
+        self.directory = directory
+        self.snapshot_path = os.path.join(directory, f"{name}.snapshot.json")
+        self.journal_path = os.path.join(directory, f"{name}.journal")
+        self.rotated_path = self.journal_path + ".1"
+        self.records = 0
+        self.file = None
+        self._lock = threading.Lock()
+        self._dirty = threading.Event()
+        self._stop = threading.Event()
+        self._snapshot = None
+        self._fsync_thread = None
+        self._flush_pending = False
+
+    @property
+    def paths(self):
+        return (self.snapshot_path, self.rotated_path, self.journal_path)
+
+    def exists(self):
+        return any(os.path.exists(path) for path in self.paths)
+
+    def last_written(self):
+        # mtime of its newest file (0 without files): which of several layouts was in use last
+        return max((os.path.getmtime(path) for path in self.paths if os.path.exists(path)), default=0)
+
+    def retire(self):
+        # Superseded (e.g. by a new shard layout): the files move to retired/ and are never read again
+        retired = os.path.join(self.directory, "retired")
+        os.makedirs(retired, exist_ok=True)
+        for path in self.paths:
+            try:
+                os.replace(path, os.path.join(retired, os.path.basename(path)))
+            except FileNotFoundError:
+                pass
+
+    def recover(self):
+        # {table: {key: value}} from the snapshot and the journals after it; a torn last line is skipped
+        tables = {}
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path) as f:
+                tables = json.load(f, object_hook=_decode)
+        replayed = 0
+        for path in (self.rotated_path, self.journal_path):
+            if not os.path.exists(path):
+                continue
+            with open(path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line, object_hook=_decode)
+                    except json.JSONDecodeError:
+                        logging.error(f"Skipping torn journal record in {path}")
+                        continue
+                    table = tables.setdefault(record[0], {})
+                    if len(record) == 3:
+                        table[record[1]] = record[2]
+                    else:
+                        table.pop(record[1], None)
+                    replayed += 1
+        self.records = replayed
+        return tables
+
+    def open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._trim_torn_tail()
+        self.file = open(self.journal_path, "a")
+        if self._fsync_thread is None:
+            self._stop.clear()
+            self._fsync_thread = threading.Thread(target=self._fsync_loop, name=f"journal-{self.name}", daemon=True)
+            self._fsync_thread.start()
+        return self
+
+    def _trim_torn_tail(self):
+        # A crash mid-write leaves a partial last line; new records must not be glued onto it
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, "rb+") as f:
+            size = f.seek(0, os.SEEK_END)
+            if not size:
+                return
+            f.seek(size - 1)
+            if f.read(1) == b"\n":
+                return
+            f.seek(max(0, size - 65536))
+            tail = f.read()
+            f.truncate(size - len(tail) + tail.rfind(b"\n") + 1)
+
+    def record(self, table, key, value=None, delete=False):
+        # Buffered write; on the event loop every record of one loop turn (e.g. a whole order fan-out) goes to
+        # the OS in a single flush right after the turn, elsewhere it is flushed immediately
+        started = time.perf_counter()
+        line = _encoder.encode([table, key] if delete else [table, key, value])
+        with self._lock:
+            self.file.write(line + "\n")
+        self.records += 1
+        if not self._flush_pending:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                self.flush()
+            else:
+                self._flush_pending = True
+                loop.call_soon(self.flush)
+        append_seconds.observe(time.perf_counter() - started)
+
+    def flush(self):
+        self._flush_pending = False
+        with self._lock:
+            if not self.file.closed:
+                self.file.flush()
+        self._dirty.set()
+
+    def snapshot(self, tables, wait=False):
+        # tables: plain {table: {key: value}} copied by the caller. The journal is rotated here, so records
+        # written from now on land after the snapshot; encoding and writing happen in a background thread
+        if self._snapshot is not None and self._snapshot.is_alive():
+            if not wait:
+                return False
+            self._snapshot.join()
+        with self._lock:
+            self.file.close()
+            self._flush_pending = False
+            if os.path.exists(self.rotated_path):
+                # The previous snapshot failed: keep its records ahead of these
+                with open(self.journal_path) as src, open(self.rotated_path, "a") as dst:
+                    dst.write(src.read())
+                os.unlink(self.journal_path)
+            else:
+                os.rename(self.journal_path, self.rotated_path)
+            self.file = open(self.journal_path, "a")
+        self.records = 0
+        self._snapshot = threading.Thread(target=self._write_snapshot, args=(tables,), name=f"snapshot-{self.name}", daemon=True)
+        self._snapshot.start()
+        if wait:
+            self._snapshot.join()
+        return True
+
+    def _write_snapshot(self, tables):
+        try:
+            with snapshot_seconds.time():
+                staging = self.snapshot_path + ".new"
+                with open(staging, "w") as f:
+                    f.write(_encoder.encode(tables))
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(staging, self.snapshot_path)
+                os.unlink(self.rotated_path)
+        except Exception as e:
+            logging.error(f"State snapshot failed: {str(e)}")
+
+    def _fsync_loop(self):
+        while not self._stop.is_set():
+            self._dirty.wait()
+            self._stop.wait(FSYNC_INTERVAL)
+            self._dirty.clear()
+            with self._lock:
+                fd = os.dup(self.file.fileno()) if self.file and not self.file.closed else None
+            if fd is not None:
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+
+    def close(self):
+        self._stop.set()
+        self._dirty.set()
+        if self._snapshot is not None:
+            self._snapshot.join()
+        with self._lock:
+            if self.file is not None and not self.file.closed:
+                self.file.flush()
+                os.fsync(self.file.fileno())
+                self.file.close()
+
+def journal_names(directory=STATE_DIR):
+    # Every journal with files in the directory (retired ones excluded)
+    suffixes = (".snapshot.json", ".journal.1", ".journal")
+    return sorted({entry[:-len(suffix)] for entry in (os.listdir(directory) if os.path.isdir(directory) else ())
+                   for suffix in suffixes if entry.endswith(suffix)})
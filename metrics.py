@@ -0,0 +1,226 @@
+import asyncio
+import functools
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter as _Tally
+from contextlib import contextmanager
+
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.01"))
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LOOP_LAG_INTERVAL = 0.5
+
+registry = {}
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{str(value)}"' for name, value in pairs) + "}"
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        return [f"{self.name}{_format_labels(key)} {value}" for key, value in self.values.items()]
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, name, help_text, callback=None):
+        self.name = name
+        self.help = help_text
+        self.callback = callback
+        self.values = {}
+
+    def set(self, value, **labels):
+        self.values[_label_key(labels)] = value
+
+    def render(self):
+        if self.callback is not None:
+            try:
+                self.values[()] = self.callback()
+            except Exception as e:
+                logging.error(f"Gauge {self.name} callback failed: {str(e)}")
+        return [f"{self.name}{_format_labels(key)} {value}" for key, value in self.values.items()]
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = buckets
+        self.series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for key, (counts, total, count) in self.series.items():
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f"{self.name}_bucket{_format_labels(key, [('le', bound)])} {cumulative}")
+                lines.append(f"{self.name}_bucket{_format_labels(key, [('le', '+Inf')])} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+def _register(metric):
+    return registry.setdefault(metric.name, metric)
+
+def counter(name, help_text):
+    return _register(Counter(name, help_text))
+
+def gauge(name, help_text, callback=None):
+    return _register(Gauge(name, help_text, callback))
+
+def histogram(name, help_text, buckets=DEFAULT_BUCKETS):
+    return _register(Histogram(name, help_text, buckets))
+
+def render():
+    lines = []
+    for metric in registry.values():
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+# Hot-path metrics
+okx_request_seconds = histogram("okx_request_seconds", "OKX REST call latency by call and outcome")
+okx_retries_total = counter("okx_retries_total", "OKX REST call retries")
+http_request_seconds = histogram("http_request_seconds", "Async upstream HTTP latency by endpoint group and status")
+sqlite_query_seconds = histogram("sqlite_query_seconds", "SQLite read latency by statement")
+sqlite_write_batch_seconds = histogram("sqlite_write_batch_seconds", "SQLite batched write transaction latency")
+sqlite_statements_total = counter("sqlite_statements_total", "SQLite statements executed by kind")
+telegram_send_seconds = histogram("telegram_send_seconds", "Telegram Bot API latency by kind and outcome")
+handler_seconds = histogram("handler_seconds", "Telegram handler execution time")
+indicator_seconds = histogram("indicator_seconds", "Indicator computation time by stage",
+                              buckets=(0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5))
+event_loop_lag_seconds = histogram("event_loop_lag_seconds", "Event loop scheduling lag")
+process_start_time = gauge("process_start_time_seconds", "Process start time (unix seconds)")
+process_start_time.set(time.time())
+
+def instrumented(handler, name=None):
+    # Wraps an async Telegram handler with handler_seconds{handler=...}
+    label = name or handler.__name__
+    @functools.wraps(handler)
+    async def wrapper(*args, **kwargs):
+        with handler_seconds.time(handler=label):
+            return await handler(*args, **kwargs)
+    return wrapper
+
+async def monitor_loop_lag(interval=LOOP_LAG_INTERVAL):
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        event_loop_lag_seconds.observe(max(0.0, time.perf_counter() - start - interval))
+
+# Sampling profiler (optional): samples one thread's stack and serves folded stacks on /profile
+class SamplingProfiler:
+    def __init__(self, interval=PROFILE_INTERVAL, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.main_thread().ident
+        self.samples = _Tally()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def folded(self):
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common()) + "\n"
+
+profiler = None
+
+def start_profiler(interval=PROFILE_INTERVAL):
+    global profiler
+    if profiler is None:
+        profiler = SamplingProfiler(interval)
+        profiler.start()
+        logging.info(f"Sampling profiler started ({interval * 1000:.0f} ms interval)")
+    return profiler
+
+# HTTP endpoint
+async def _handle(reader, writer):
+    try:
+        request_line = (await reader.readline()).decode(errors="replace").split()
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+        path = request_line[1] if len(request_line) > 1 else "/"
+        if path.startswith("/metrics"):
+            status, body, content_type = "200 OK", render(), "text/plain; version=0.0.4"
+        elif path.startswith("/profile") and profiler is not None:
+            status, body, content_type = "200 OK", profiler.folded(), "text/plain"
+        else:
+            status, body, content_type = "404 Not Found", "not found\n", "text/plain"
+        payload = body.encode()
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(payload)}\r\n"
+                     f"Connection: close\r\n\r\n".encode() + payload)
+        await writer.drain()
+    except Exception as e:
+        logging.error(f"Metrics request failed: {str(e)}")
+    finally:
+        writer.close()
+
+async def start_server(host=METRICS_HOST, port=METRICS_PORT):
+    server = await asyncio.start_server(_handle, host, port)
+    logging.info(f"Metrics endpoint on http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,157 @@
+import argparse
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import strategy
+from backtest import (load_candles, run_backtest, compute_indicators, signal_trend, trend_bar_filter, summarize,
+                      DEFAULT_TRADE_SIZE)
+from scheduler import SIGNAL_BAR, TREND_BAR
+
+CANDLE_FIELDS = ("ts", "open", "high", "low", "close")
+OBJECTIVES = {
+    "total_pnl": lambda stats: stats["total_pnl"],
+    "win_rate": lambda stats: stats["win_rate"],
+    "pnl_drawdown": lambda stats: stats["total_pnl"] / (stats["max_drawdown"] or 1.0),
+}
+
+# Shared Candles (one copy in shared memory, attached read-only by every worker)
+def share_candles(candles):
+    n = len(candles["close"])
+    shm = shared_memory.SharedMemory(create=True, size=max(1, len(CANDLE_FIELDS) * n * 8))
+    block = np.ndarray((len(CANDLE_FIELDS), n), dtype=np.float64, buffer=shm.buf)
+    for i, field in enumerate(CANDLE_FIELDS):
+        # Millisecond timestamps are exact in float64
+        block[i] = candles[field]
+    return shm
+
+def attach_candles(name, n):
+    shm = shared_memory.SharedMemory(name=name)
+    block = np.ndarray((len(CANDLE_FIELDS), n), dtype=np.float64, buffer=shm.buf)
+    block.flags.writeable = False
+    candles = {field: block[i] for i, field in enumerate(CANDLE_FIELDS)}
+    candles["ts"] = candles["ts"].astype(np.int64)
+    return shm, candles
+
+# Worker
+_worker = {}
+
+def _init_worker(name, n, trade_size, bars):
+    shm, candles = attach_candles(name, n)
+    _worker.update(shm=shm, candles=candles, trade_size=trade_size, bars=bars, series={})
+
+def _series(name, compute):
+    # Each EMA period and the ATR are computed once per worker and reused across jobs
+    series = _worker["series"]
+    if name not in series:
+        series[name] = compute()
+    return series[name]
+
+def _indicators(ema_periods):
+    candles = _worker["candles"]
+    indicators = {f"ema_{period}": _series(f"ema_{period}", lambda period=period: compute_indicators(candles, (period,))[f"ema_{period}"])
+                  for period in ema_periods}
+    indicators["atr"] = _series("atr", lambda: compute_indicators(candles, ())["atr"])
+    return indicators
+
+def _trend_filter(ema_periods):
+    # Trend-bar filter for these EMA periods, or None when the sweep runs without one
+    bar, trend_bar = _worker["bars"]
+    if not trend_bar or trend_bar == bar:
+        return None
+    return _series(("trend",) + ema_periods, lambda: trend_bar_filter(_worker["candles"], bar, trend_bar, ema_periods))
+
+def _evaluate(job):
+    params, start, end = job
+    ema_periods = (params["ema_short_period"], params["ema_mid_period"], params["ema_long_period"])
+    series = _indicators(ema_periods)
+    indicators = {key: values[start:end] for key, values in series.items()}
+    # The trend going into the window, so a trend that was already stacked is not entered at its first candle
+    previous_trend = 0
+    if start:
+        previous_trend = int(signal_trend({key: values[start - 1:start] for key, values in series.items()}, ema_periods)[0])
+    candles = {key: values[start:end] for key, values in _worker["candles"].items()}
+    trend_filter = _trend_filter(ema_periods)
+    trades, equity = run_backtest(candles, trade_size=_worker["trade_size"], ema_periods=ema_periods,
+                                  stop_loss=params["stop_loss_pct"], trailing_factor=params["trailing_stop_factor"],
+                                  indicators=indicators, trend_filter=None if trend_filter is None else trend_filter[start:end],
+                                  previous_trend=previous_trend)
+    return params, start, end, summarize(trades, equity)
+
+# Sweep
+def parameter_grid(ema_short, ema_mid, ema_long, stop_loss, trailing):
+    for short, mid, long_, sl, trail in itertools.product(ema_short, ema_mid, ema_long, stop_loss, trailing):
+        if short < mid < long_:
+            yield {"ema_short_period": short, "ema_mid_period": mid, "ema_long_period": long_,
+                   "stop_loss_pct": sl, "trailing_stop_factor": trail}
+
+def walk_forward_splits(n, folds):
+    # Rolling walk-forward: train on segment k, test on segment k + 1
+    if folds <= 0:
+        return [((0, n), None)]
+    bounds = np.linspace(0, n, folds + 2).astype(int)
+    return [((bounds[k], bounds[k + 1]), (bounds[k + 1], bounds[k + 2])) for k in range(folds)]
+
+def run_sweep(candles, grid, folds=0, workers=None, trade_size=DEFAULT_TRADE_SIZE, objective="total_pnl",
+              bar=SIGNAL_BAR, trend_bar=TREND_BAR):
+    score = OBJECTIVES[objective]
+    n = len(candles["close"])
+    grid = list(grid)
+    splits = walk_forward_splits(n, folds)
+    shm = share_candles(candles)
+    try:
+        workers = workers or os.cpu_count()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(shm.name, n, trade_size, (bar, trend_bar))) as pool:
+            train_jobs = [(params, start, end) for (start, end), _ in splits for params in grid]
+            chunksize = max(1, len(train_jobs) // (workers * 8))
+            train_results = {}
+            for params, start, end, stats in pool.map(_evaluate, train_jobs, chunksize=chunksize):
+                train_results.setdefault((start, end), []).append((params, stats))
+            report = []
+            test_jobs = []
+            for train, test in splits:
+                ranked = sorted(train_results[train], key=lambda result: score(result[1]), reverse=True)
+                best_params, best_stats = ranked[0]
+                report.append({"train": [int(train[0]), int(train[1])], "test": [int(test[0]), int(test[1])] if test else None,
+                               "params": best_params, "train_stats": best_stats, "test_stats": None})
+                if test:
+                    test_jobs.append((best_params, test[0], test[1]))
+            for fold, (_, _, _, stats) in zip(report, pool.map(_evaluate, test_jobs)):
+                fold["test_stats"] = stats
+            return report
+    finally:
+        shm.close()
+        shm.unlink()
+
+def _values(kind):
+    return lambda text: [kind(value) for value in text.split(",")]
+
+def main():
+    parser = argparse.ArgumentParser(description="Parameter sweep / walk-forward optimizer for the EMA/ATR strategy")
+    parser.add_argument("candles", help="candles file (.npz, .csv or OKX JSON payload)")
+    parser.add_argument("--ema-short", type=_values(int), default=[strategy.ema_short_period])
+    parser.add_argument("--ema-mid", type=_values(int), default=[strategy.ema_mid_period])
+    parser.add_argument("--ema-long", type=_values(int), default=[strategy.ema_long_period])
+    parser.add_argument("--stop-loss", type=_values(float), default=[strategy.stop_loss_pct])
+    parser.add_argument("--trailing", type=_values(float), default=[strategy.trailing_stop_factor])
+    parser.add_argument("--folds", type=int, default=0, help="walk-forward folds (0 = single in-sample sweep)")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--trade-size", type=float, default=DEFAULT_TRADE_SIZE)
+    parser.add_argument("--objective", choices=sorted(OBJECTIVES), default="total_pnl")
+    parser.add_argument("--bar", default=SIGNAL_BAR, help="bar of the candles")
+    parser.add_argument("--trend-bar", default=TREND_BAR, help="bar whose EMA trend must agree with an entry (empty: no filter)")
+    args = parser.parse_args()
+
+    candles = load_candles(args.candles)
+    grid = list(parameter_grid(args.ema_short, args.ema_mid, args.ema_long, args.stop_loss, args.trailing))
+    start = time.perf_counter()
+    report = run_sweep(candles, grid, folds=args.folds, workers=args.workers, trade_size=args.trade_size, objective=args.objective,
+                       bar=args.bar, trend_bar=args.trend_bar)
+    print(json.dumps({"combinations": len(grid), "folds": max(1, args.folds), "seconds": round(time.perf_counter() - start, 2),
+                      "results": report}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import numpy as np
+import strategy
+
+INITIAL_CAPACITY = 1024
+
+class PositionMonitor:
+    # Open positions as parallel NumPy arrays; one vectorized pass per price tick checks every exit rule
+    def __init__(self, capacity=INITIAL_CAPACITY, stop_loss=None, trailing_factor=None):
+        self.stop_loss = strategy.stop_loss_pct if stop_loss is None else stop_loss
+        self.trailing_factor = strategy.trailing_stop_factor if trailing_factor is None else trailing_factor
+        self.chat_ids = [None] * capacity
+        self.slots = {}
+        self._free = list(range(capacity - 1, -1, -1))
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        self.entry = np.zeros(capacity)
+        self.direction = np.zeros(capacity, dtype=np.int8)
+        self.atr = np.zeros(capacity)
+        self.extreme = np.zeros(capacity)
+        self.stop = np.zeros(capacity)
+        self.tp = np.full(capacity, np.nan)
+        self.active = np.zeros(capacity, dtype=bool)
+
+    def _grow(self):
+        old = len(self.chat_ids)
+        arrays = {name: getattr(self, name) for name in ("entry", "direction", "atr", "extreme", "stop", "tp", "active")}
+        self._allocate(old * 2)
+        for name, values in arrays.items():
+            getattr(self, name)[:old] = values
+        self.chat_ids.extend([None] * old)
+        self._free.extend(range(old * 2 - 1, old - 1, -1))
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __contains__(self, chat_id):
+        return chat_id in self.slots
+
+    def add(self, chat_id, side, entry_price, entry_atr, tp=None, extreme=None):
+        # extreme: trailing high/low carried over from a recovered snapshot
+        if chat_id in self.slots:
+            self.remove(chat_id)
+        if not self._free:
+            self._grow()
+        slot = self._free.pop()
+        direction = 1 if side == "long" else -1
+        self.slots[chat_id] = slot
+        self.chat_ids[slot] = chat_id
+        self.entry[slot] = entry_price
+        self.direction[slot] = direction
+        self.atr[slot] = entry_atr
+        self.extreme[slot] = entry_price if extreme is None else extreme
+        self.stop[slot] = strategy.stop_price(entry_price, direction, self.stop_loss)
+        self.tp[slot] = self._tp_for(slot, tp)
+        self.active[slot] = True
+
+    def _tp_for(self, slot, tp):
+        # A TP on the loss side of the entry would close the position at once as "Take Profit": ignored
+        if tp is None or (tp - self.entry[slot]) * self.direction[slot] <= 0:
+            return np.nan
+        return tp
+
+    def set_tp(self, chat_id, tp):
+        slot = self.slots.get(chat_id)
+        if slot is not None:
+            self.tp[slot] = self._tp_for(slot, tp)
+
+    def remove(self, chat_id):
+        slot = self.slots.pop(chat_id, None)
+        if slot is None:
+            return
+        self.active[slot] = False
+        self.direction[slot] = 0
+        self.chat_ids[slot] = None
+        self._free.append(slot)
+
+    def resume(self, chat_id):
+        # Re-arm a position whose exit order failed; its trailing extreme is kept
+        slot = self.slots.get(chat_id)
+        if slot is not None:
+            self.active[slot] = True
+
+    def tick(self, price):
+        # Returns [(chat_id, exit_type, price)]; exiting positions are disarmed until remove() or resume()
+        if not self.slots:
+            return []
+        direction = self.direction
+        self.extreme = np.where(direction == 1, np.maximum(self.extreme, price), np.minimum(self.extreme, price))
+        trailing = strategy.trailing_stop_price(self.extreme, self.atr, direction, self.trailing_factor)
+        level = np.where(direction == 1, np.maximum(self.stop, trailing), np.minimum(self.stop, trailing))
+        stopped = self.active & ((price - level) * direction <= 0)
+        take_profit = self.active & ~np.isnan(self.tp) & ((price - self.tp) * direction >= 0)
+        exiting = np.flatnonzero(stopped | take_profit)
+        if not len(exiting):
+            return []
+        self.active[exiting] = False
+        events = []
+        for slot in exiting.tolist():
+            if take_profit[slot]:
+                exit_type = "Take Profit"
+            elif level[slot] == self.stop[slot]:
+                exit_type = "Stop Loss"
+            else:
+                exit_type = "Trailing Stop"
+            events.append((self.chat_ids[slot], exit_type, price))
+        return events
@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import os
+import time
+import strategy
+import metrics
+
+INSTRUMENTS = [inst.strip() for inst in os.getenv("INSTRUMENTS", strategy.instId).split(",") if inst.strip()]
+SIGNAL_BAR = os.getenv("SIGNAL_BAR", "15m")
+TREND_BAR = os.getenv("TREND_BAR", "4H")
+# Candles are fetched this long after they close, so the exchange has confirmed them
+CLOSE_DELAY = 2.0
+# Bars aligned to UTC; OKX aligns 6H and longer to Hong Kong time unless suffixed with "utc"
+BAR_SECONDS = {"1m": 60, "3m": 180, "5m": 300, "15m": 900, "30m": 1800, "1H": 3600, "2H": 7200, "4H": 14400}
+
+signals_total = metrics.counter("signals_total", "Strategy signals by instrument and side")
+scheduler_round_seconds = metrics.histogram("scheduler_round_seconds", "Wall-clock time of one scheduler refresh round")
+
+class SignalScheduler:
+    # Evaluates the EMA/ATR strategy for every instrument on each candle close. The source is called once per
+    # (instrument, bar) no matter how many users trade it, and all instruments are refreshed concurrently, so a
+    # round takes about one round trip plus CPU (rate limiting happens per endpoint group in http_client).
+    def __init__(self, source, instruments=None, signal_bar=SIGNAL_BAR, trend_bar=TREND_BAR, close_delay=CLOSE_DELAY):
+        # source(inst_id, bar) -> (last confirmed ts, indicator values, last confirmed close) or None
+        self.source = source
+        self.instruments = list(instruments or INSTRUMENTS)
+        self.signal_bar = signal_bar
+        self.trend_bar = trend_bar
+        self.bars = [bar for bar in (trend_bar, signal_bar) if bar]
+        self.close_delay = close_delay
+        self.snapshots = {}
+        self.trends = {}
+        self.evaluated = {}
+        self.signal_callbacks = []
+        self.last_round = None
+        self._stopping = False
+        for bar in self.bars:
+            if bar not in BAR_SECONDS:
+                raise ValueError(f"Unsupported bar {bar}; use one of {', '.join(BAR_SECONDS)}")
+
+    def on_signal(self, callback):
+        self.signal_callbacks.append(callback)
+        return callback
+
+    def stop(self):
+        self._stopping = True
+
+    async def run(self):
+        self._stopping = False
+        await self.poll()
+        while not self._stopping:
+            now = time.time()
+            boundary = min((now // BAR_SECONDS[bar] + 1) * BAR_SECONDS[bar] for bar in self.bars)
+            await asyncio.sleep(boundary + self.close_delay - now)
+            # Every bar whose candle closed at this boundary (a 4H close is also a 15m close)
+            await self.poll([bar for bar in self.bars if boundary % BAR_SECONDS[bar] == 0])
+
+    async def poll(self, bars=None):
+        bars = bars or self.bars
+        jobs = [(inst_id, bar) for inst_id in self.instruments for bar in bars]
+        started = time.perf_counter()
+        results = await asyncio.gather(*(self.source(inst_id, bar) for inst_id, bar in jobs), return_exceptions=True)
+        for (inst_id, bar), result in zip(jobs, results):
+            if isinstance(result, Exception) or result is None:
+                logging.error(f"Market data refresh failed for {inst_id} {bar}: {result}")
+                continue
+            self.snapshots[(inst_id, bar)] = result
+        elapsed = time.perf_counter() - started
+        scheduler_round_seconds.observe(elapsed)
+        self.last_round = {"bars": bars, "fetches": len(jobs), "seconds": elapsed}
+        if self.signal_bar in bars:
+            for inst_id in self.instruments:
+                await self._evaluate(inst_id)
+
+    def trend(self, inst_id, bar):
+        snapshot = self.snapshots.get((inst_id, bar))
+        if snapshot is None:
+            return 0
+        values = snapshot[1]
+        return int(strategy.ema_trend(*(values[f"ema_{period}"] for period in
+                                        (strategy.ema_short_period, strategy.ema_mid_period, strategy.ema_long_period))))
+
+    async def _evaluate(self, inst_id):
+        # Same entry rule as the backtester (run_backtest with trend_bar_filter): fires on the candle where the
+        # EMAs first stack in a direction, and only when the trend bar is stacked the same way
+        snapshot = self.snapshots.get((inst_id, self.signal_bar))
+        if snapshot is None or snapshot[0] == self.evaluated.get(inst_id):
+            return
+        self.evaluated[inst_id] = snapshot[0]
+        trend = self.trend(inst_id, self.signal_bar)
+        previous = self.trends.get(inst_id)
+        self.trends[inst_id] = trend
+        # The first candle after a (re)start only records the trend; it is not a fresh crossover
+        if previous is None or trend == 0 or trend == previous:
+            return
+        if self.trend_bar and self.trend(inst_id, self.trend_bar) != trend:
+            return
+        _, values, close = snapshot
+        if not values["atr"] > 0:
+            return
+        side = "long" if trend == 1 else "short"
+        signals_total.inc(inst_id=inst_id, side=side)
+        for callback in self.signal_callbacks:
+            try:
+                await callback(inst_id, side, close, values["atr"])
+            except Exception as e:
+                logging.error(f"Signal callback failed for {inst_id}: {str(e)}")
@@ -0,0 +1,195 @@
+import asyncio
+import json
+import logging
+import os
+import zlib
+from collections import deque
+import metrics
+
+# Sharded mode: one market-data process (the publisher) polls OKX and Telegram once and streams signals, tickers
+# and Telegram updates over a Unix socket to N worker processes; each worker owns the chats that hash to its shard
+SHARD_SOCKET = os.getenv("SHARD_SOCKET", "/tmp/goodboytrader.sock")
+# Fixed, not derived from the host: the shard count decides which worker owns each chat, so changing it
+# repartitions every user (their state moves over through the journal on the next start)
+SHARDS = int(os.getenv("SHARDS", "2"))
+# Messages queued per worker before the publisher starts dropping (a worker that stopped reading)
+QUEUE_LIMIT = 10000
+# Telegram updates held for a shard whose worker is (re)starting
+BACKLOG_LIMIT = 1000
+RECONNECT_DELAY = 1.0
+
+messages_total = metrics.counter("shard_messages_total", "Messages sent to shard workers by type")
+dropped_total = metrics.counter("shard_dropped_total", "Messages dropped for slow or missing shard workers by type")
+
+def shard_of(chat_id, shards=SHARDS):
+    # Stable across processes and restarts (str hash() is salted per process)
+    return zlib.crc32(str(chat_id).encode()) % shards
+
+def _encode(message):
+    return (json.dumps(message, separators=(",", ":")) + "\n").encode()
+
+async def _dispatch(handlers, message):
+    handler = handlers.get(message.get("type"))
+    if handler is None:
+        return
+    try:
+        await handler(message)
+    except Exception as e:
+        logging.error(f"Shard message {message.get('type')} failed: {str(e)}")
+
+class Publisher:
+    def __init__(self, path=SHARD_SOCKET, shards=SHARDS):
+        self.path = path
+        self.shards = shards
+        self.links = {}
+        self.backlog = {}
+        self.handlers = {}
+        self.server = None
+        self._connections = set()
+        metrics.gauge("shard_workers_connected", "Shard workers connected to the publisher", lambda: len(self.links))
+
+    def on(self, kind, handler):
+        # handler(message) for messages workers send upstream
+        self.handlers[kind] = handler
+        return handler
+
+    async def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.server = await asyncio.start_unix_server(self._serve, self.path)
+        logging.info(f"Publishing to {self.shards} shard(s) on {self.path}")
+        return self.server
+
+    async def close(self):
+        # Stops accepting workers and closes every link once what is already queued has been written
+        if self.server is not None:
+            self.server.close()
+        for queue in self.links.values():
+            queue.put_nowait(None)
+        await asyncio.gather(*self._connections, return_exceptions=True)
+
+    def publish(self, message):
+        # To every connected worker (signals, tickers); a worker that is down misses it
+        for shard in list(self.links):
+            self.send(shard, message)
+
+    def route(self, chat_id, message):
+        self.send(shard_of(chat_id, self.shards), message)
+
+    def send(self, shard, message):
+        queue = self.links.get(shard)
+        if queue is None:
+            if message["type"] == "update":
+                backlog = self.backlog.setdefault(shard, deque(maxlen=BACKLOG_LIMIT))
+                if len(backlog) == backlog.maxlen:
+                    dropped_total.inc(type=message["type"])
+                backlog.append(message)
+            else:
+                dropped_total.inc(type=message["type"])
+            return
+        try:
+            queue.put_nowait(message)
+            messages_total.inc(type=message["type"])
+        except asyncio.QueueFull:
+            dropped_total.inc(type=message["type"])
+
+    def stats(self):
+        return {"connected": sorted(self.links), "shards": self.shards,
+                "queued": sum(queue.qsize() for queue in self.links.values())}
+
+    async def _serve(self, reader, writer):
+        shard = None
+        queue = asyncio.Queue(QUEUE_LIMIT)
+        sender = None
+        self._connections.add(asyncio.current_task())
+        try:
+            hello = json.loads(await reader.readline() or b"{}")
+            shard = hello.get("shard")
+            if hello.get("shards") != self.shards or not isinstance(shard, int) or not 0 <= shard < self.shards:
+                logging.error(f"Rejected shard worker {hello}: publisher runs {self.shards} shard(s)")
+                return
+            previous = self.links.get(shard)
+            if previous is not None:
+                previous.put_nowait(None)
+            self.links[shard] = queue
+            for message in self.backlog.pop(shard, ()):
+                self.send(shard, message)
+            logging.info(f"Shard {shard} connected")
+            sender = asyncio.create_task(self._send_loop(queue, writer))
+            while line := await reader.readline():
+                await _dispatch(self.handlers, json.loads(line))
+        except (ConnectionError, json.JSONDecodeError) as e:
+            logging.error(f"Shard {shard} link failed: {str(e)}")
+        finally:
+            if shard is not None and self.links.get(shard) is queue:
+                del self.links[shard]
+                logging.info(f"Shard {shard} disconnected")
+            if sender is not None:
+                sender.cancel()
+            writer.close()
+            self._connections.discard(asyncio.current_task())
+
+    @staticmethod
+    async def _send_loop(queue, writer):
+        while (message := await queue.get()) is not None:
+            writer.write(_encode(message))
+            # Write everything already queued before waiting on the socket
+            while not queue.empty() and (message := queue.get_nowait()) is not None:
+                writer.write(_encode(message))
+            await writer.drain()
+            if message is None:
+                break
+        writer.close()
+
+class WorkerLink:
+    def __init__(self, shard, shards=SHARDS, path=SHARD_SOCKET):
+        self.shard = shard
+        self.shards = shards
+        self.path = path
+        self.handlers = {}
+        self.writer = None
+        self._stopping = False
+
+    def on(self, kind, handler):
+        # handler(message) for messages from the publisher: "signal", "ticker", "update", ...
+        self.handlers[kind] = handler
+        return handler
+
+    def owns(self, chat_id):
+        return shard_of(chat_id, self.shards) == self.shard
+
+    def send(self, message):
+        # Upstream to the publisher; dropped while disconnected
+        if self.writer is None:
+            dropped_total.inc(type=message["type"])
+            return
+        self.writer.write(_encode(message))
+
+    def stop(self):
+        self._stopping = True
+        if self.writer is not None:
+            self.writer.close()
+
+    async def run(self):
+        self._stopping = False
+        while not self._stopping:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path)
+            except OSError as e:
+                logging.error(f"Shard {self.shard}: publisher unavailable ({str(e)}), retrying")
+                await asyncio.sleep(RECONNECT_DELAY)
+                continue
+            self.writer = writer
+            writer.write(_encode({"type": "hello", "shard": self.shard, "shards": self.shards}))
+            logging.info(f"Shard {self.shard}/{self.shards} connected to {self.path}")
+            try:
+                while line := await reader.readline():
+                    await _dispatch(self.handlers, json.loads(line))
+            except (ConnectionError, json.JSONDecodeError) as e:
+                logging.error(f"Shard {self.shard} link failed: {str(e)}")
+            finally:
+                self.writer = None
+                writer.close()
+            if not self._stopping:
+                logging.error(f"Shard {self.shard}: publisher went away, reconnecting")
+                await asyncio.sleep(RECONNECT_DELAY)
@@ -0,0 +1,349 @@
+import sqlite3
+import threading
+import queue
+import logging
+import atexit
+import os
+from datetime import datetime
+import pytz
+from user_cache import UserCache, UserRecord
+import metrics
+
+# Storage Setup
+DB_PATH = os.getenv("GOODBOY_DB", "users.db")
+TIMEZONE = pytz.timezone('Asia/Singapore')
+WRITE_BATCH_SIZE = 500
+STATEMENT_CACHE_SIZE = 256
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+
+PAID_TIERS = ("standard", "elite")
+DEFAULT_USER = ("free", 0, 0, 0, None, None, None, None, None, None, None, 0, None)
+
+# Statements (kept as constants so each connection's statement cache reuses them)
+SELECT_USER = "SELECT * FROM users WHERE chat_id = ?"
+REPLACE_USER = "INSERT OR REPLACE INTO users VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+UPDATE_USER_PNL = "UPDATE users SET pnl = ? WHERE chat_id = ?"
+SELECT_ACTIVE_SUBSCRIBERS = "SELECT chat_id, trade_size, api_key, api_secret, api_pass FROM users WHERE tier IN ('standard', 'elite') AND trade_size > 0 AND api_key IS NOT NULL"
+SELECT_CHATS_BY_TIER = "SELECT chat_id FROM users WHERE tier = ?"
+SELECT_REFERRER_BY_CODE = "SELECT chat_id FROM users WHERE referral_code = ?"
+INSERT_TRADE = "INSERT INTO trades VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+SELECT_TRADE_STATS = "SELECT COUNT(*), COALESCE(SUM(pnl), 0), COALESCE(SUM(pnl > 0), 0), COALESCE(SUM(pnl < 0), 0) FROM trades WHERE chat_id = ?"
+SELECT_RECENT_TRADES = "SELECT entry_time, entry_price, exit_time, exit_price, side, pnl FROM trades WHERE chat_id = ? ORDER BY entry_time DESC LIMIT ?"
+INSERT_REFERRAL = "INSERT OR IGNORE INTO referrals VALUES (?, ?, ?)"
+SELECT_REFERRAL_STATS = "SELECT valid_refs, total_profit FROM referral_stats WHERE referrer_id = ?"
+# Recounts paid invitees for every referrer of one referee (indexed, touches only that referrer's rows)
+REFRESH_VALID_REFERRALS = """
+    INSERT INTO referral_stats (referrer_id, valid_refs)
+    SELECT r.referrer_id,
+           (SELECT COUNT(*) FROM referrals r2 JOIN users u ON r2.referee_id = u.chat_id
+            WHERE r2.referrer_id = r.referrer_id AND u.tier IN ('standard', 'elite'))
+    FROM referrals r WHERE r.referee_id = ?
+    ON CONFLICT(referrer_id) DO UPDATE SET valid_refs = excluded.valid_refs
+    """
+INSERT_REFERRAL_PROFIT = "INSERT INTO referral_profits SELECT referrer_id, referee_id, ?, ? FROM referrals WHERE referee_id = ?"
+ADD_MONTHLY_REFERRAL_PROFIT = """
+    INSERT INTO referral_monthly (referrer_id, month, profit)
+    SELECT referrer_id, ?, ? FROM referrals WHERE referee_id = ?
+    ON CONFLICT(referrer_id, month) DO UPDATE SET profit = profit + excluded.profit
+    """
+ADD_TOTAL_REFERRAL_PROFIT = """
+    INSERT INTO referral_stats (referrer_id, total_profit)
+    SELECT referrer_id, ? FROM referrals WHERE referee_id = ?
+    ON CONFLICT(referrer_id) DO UPDATE SET total_profit = total_profit + excluded.total_profit
+    """
+SELECT_UNPAID_REFERRAL_MONTHS = "SELECT referrer_id, month, profit FROM referral_monthly WHERE paid = 0 AND month < ?"
+MARK_REFERRAL_MONTH_PAID = "UPDATE referral_monthly SET paid = 1 WHERE referrer_id = ? AND month = ?"
+# Metric labels: statement constant name, lowercased
+STATEMENT_NAMES = {sql: name.lower() for name, sql in list(globals().items())
+                   if isinstance(sql, str) and name.split("_")[0] in ("SELECT", "REPLACE", "UPDATE", "INSERT", "REFRESH", "ADD", "MARK")}
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS users
+        (chat_id TEXT PRIMARY KEY, tier TEXT, trade_size REAL, pnl REAL, profit_cut REAL, signup_date TEXT, sub_expiry TEXT, api_key TEXT, api_secret TEXT, api_pass TEXT, referral_code TEXT, referred_by TEXT, referral_reward_claimed INTEGER DEFAULT 0, wallet TEXT)''',
+    '''CREATE TABLE IF NOT EXISTS trades
+        (chat_id TEXT, entry_time TEXT, entry_price REAL, exit_time TEXT, exit_price REAL, side TEXT, size_sol REAL, pnl REAL)''',
+    '''CREATE TABLE IF NOT EXISTS referrals
+        (referrer_id TEXT, referee_id TEXT, timestamp TEXT, PRIMARY KEY (referrer_id, referee_id))''',
+    '''CREATE TABLE IF NOT EXISTS referral_profits
+        (referrer_id TEXT, referee_id TEXT, trade_time TEXT, profit REAL)''',
+    '''CREATE TABLE IF NOT EXISTS referral_monthly
+        (referrer_id TEXT, month TEXT, profit REAL DEFAULT 0, paid INTEGER DEFAULT 0, PRIMARY KEY (referrer_id, month))''',
+    '''CREATE TABLE IF NOT EXISTS referral_stats
+        (referrer_id TEXT PRIMARY KEY, valid_refs INTEGER DEFAULT 0, total_profit REAL DEFAULT 0)''',
+    "CREATE INDEX IF NOT EXISTS idx_users_referral_code ON users (referral_code)",
+    "CREATE INDEX IF NOT EXISTS idx_users_tier ON users (tier)",
+    "CREATE INDEX IF NOT EXISTS idx_trades_chat_entry ON trades (chat_id, entry_time)",
+    "CREATE INDEX IF NOT EXISTS idx_referrals_referee ON referrals (referee_id)",
+    "CREATE INDEX IF NOT EXISTS idx_referral_profits_referrer_time ON referral_profits (referrer_id, trade_time)",
+    "CREATE INDEX IF NOT EXISTS idx_referral_monthly_unpaid ON referral_monthly (paid, month)",
+]
+
+# One-time rollup of history that predates the rollup tables
+BACKFILL_ROLLUPS = [
+    '''INSERT INTO referral_monthly (referrer_id, month, profit)
+        SELECT referrer_id, substr(trade_time, 1, 7), SUM(profit) FROM referral_profits GROUP BY referrer_id, substr(trade_time, 1, 7)''',
+    '''INSERT INTO referral_stats (referrer_id, valid_refs, total_profit)
+        SELECT r.referrer_id,
+               SUM(CASE WHEN u.tier IN ('standard', 'elite') THEN 1 ELSE 0 END),
+               COALESCE((SELECT SUM(profit) FROM referral_profits p WHERE p.referrer_id = r.referrer_id), 0)
+        FROM referrals r LEFT JOIN users u ON r.referee_id = u.chat_id GROUP BY r.referrer_id''',
+]
+
+def connect(path=None):
+    conn = sqlite3.connect(path or DB_PATH, check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=5000")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+# Batched Writer
+class WriteQueue:
+    def __init__(self, path=None, batch_size=WRITE_BATCH_SIZE):
+        self.path = path or DB_PATH
+        self.batch_size = batch_size
+        self._queue = queue.Queue()
+        self._cond = threading.Condition()
+        self._submitted = 0
+        self._committed = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, sql, params=()):
+        self.submit_many([(sql, params)])
+
+    def submit_many(self, statements):
+        # Statements submitted together are committed in the same transaction
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("WriteQueue is closed")
+            self._submitted += 1
+            ticket = self._submitted
+        self._queue.put((ticket, list(statements)))
+        return ticket
+
+    def pending(self):
+        with self._cond:
+            return self._submitted - self._committed
+
+    def flush(self, timeout=None):
+        with self._cond:
+            target = self._submitted
+            return self._cond.wait_for(lambda: self._committed >= target, timeout=timeout)
+
+    def close(self, timeout=5):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _drain(self, first):
+        # Group commit: everything queued while the previous batch was committing goes in this one
+        batch = [first]
+        while len(batch) < self.batch_size:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(item)
+            if item is None:
+                break
+        return batch
+
+    def _run(self):
+        conn = connect(self.path)
+        running = True
+        while running:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = self._drain(item)
+            if batch[-1] is None:
+                batch.pop()
+                running = False
+            last_ticket = batch[-1][0]
+            try:
+                with metrics.sqlite_write_batch_seconds.time(), conn:
+                    self._execute_batch(conn, [stmt for _, statements in batch for stmt in statements])
+            except Exception as e:
+                logging.error(f"Batched write of {len(batch)} jobs failed, retrying one by one: {str(e)}")
+                for _, statements in batch:
+                    try:
+                        with conn:
+                            self._execute_batch(conn, statements)
+                    except Exception as e:
+                        logging.error(f"Dropped write {statements}: {str(e)}")
+            with self._cond:
+                self._committed = last_ticket
+                self._cond.notify_all()
+        conn.close()
+
+    @staticmethod
+    def _execute_batch(conn, statements):
+        # Consecutive runs of the same statement go through executemany
+        i = 0
+        while i < len(statements):
+            sql = statements[i][0]
+            j = i + 1
+            while j < len(statements) and statements[j][0] == sql:
+                j += 1
+            if j - i == 1:
+                conn.execute(sql, statements[i][1])
+            else:
+                conn.executemany(sql, [params for _, params in statements[i:j]])
+            metrics.sqlite_statements_total.inc(j - i, statement=STATEMENT_NAMES.get(sql, "other"))
+            i = j
+
+# Connections
+user_cache = UserCache(USER_CACHE_SIZE)
+_local = threading.local()
+_writer = None
+_writer_lock = threading.Lock()
+metrics.gauge("sqlite_write_queue_pending", "Write jobs queued but not yet committed",
+              lambda: _writer.pending() if _writer is not None else 0)
+metrics.gauge("user_cache_hit_rate", "User cache hit rate", lambda: user_cache.stats()["hit_rate"])
+
+def reader():
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _local.conn = connect()
+    return conn
+
+def writer():
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = WriteQueue()
+    return _writer
+
+def query_one(sql, params=()):
+    _sync_reads()
+    with metrics.sqlite_query_seconds.time(statement=STATEMENT_NAMES.get(sql, "other")):
+        return reader().execute(sql, params).fetchone()
+
+def query_all(sql, params=()):
+    _sync_reads()
+    with metrics.sqlite_query_seconds.time(statement=STATEMENT_NAMES.get(sql, "other")):
+        return reader().execute(sql, params).fetchall()
+
+def _sync_reads():
+    # Read-your-writes: wait for queued writes before reading
+    if _writer is not None and _writer.pending():
+        _writer.flush()
+
+def execute(sql, params=()):
+    writer().submit(sql, params)
+
+def execute_many(statements):
+    writer().submit_many(statements)
+
+def flush(timeout=None):
+    if _writer is not None:
+        return _writer.flush(timeout)
+    return True
+
+def close():
+    global _writer
+    user_cache.invalidate()
+    if _writer is not None:
+        _writer.close()
+        _writer = None
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+atexit.register(close)
+
+def init_db():
+    conn = connect()
+    rollups_exist = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'referral_stats'").fetchone()
+    for statement in SCHEMA:
+        conn.execute(statement)
+    if not rollups_exist:
+        for statement in BACKFILL_ROLLUPS:
+            conn.execute(statement)
+    conn.commit()
+    conn.close()
+
+# Users
+def get_user(chat_id):
+    record = user_cache.get(chat_id)
+    if record is None:
+        result = query_one(SELECT_USER, (chat_id,))
+        record = UserRecord.from_row(result or (chat_id,) + DEFAULT_USER)
+        user_cache.put(record)
+    return record
+
+def update_user(chat_id, tier, trade_size, expiry=None, api_key=None, api_secret=None, api_pass=None, referral_code=None, referred_by=None, referral_reward_claimed=None, wallet=None):
+    current = get_user(chat_id)
+    was_paid = current[1] in PAID_TIERS
+    profit_cut = 0.05 if tier == "standard" else 0.03 if tier == "elite" else 0
+    signup_date = datetime.now(TIMEZONE).isoformat() if tier == "free" else current[5]
+    sub_expiry = expiry or current[6]
+    referral_reward = referral_reward_claimed if referral_reward_claimed is not None else current[12]
+    wallet = wallet or current[13]
+    record = UserRecord(chat_id, tier, trade_size, current[3] or 0, profit_cut, signup_date, sub_expiry,
+                        api_key or current[7], api_secret or current[8], api_pass or current[9],
+                        referral_code or current[10], referred_by or current[11], referral_reward, wallet)
+    # Write-through: the cache is updated before the row is queued, so readers never see stale data
+    user_cache.put(record)
+    statements = [(REPLACE_USER, record.to_row())]
+    if was_paid != (tier in PAID_TIERS):
+        statements.append((REFRESH_VALID_REFERRALS, (chat_id,)))
+    execute_many(statements)
+
+def active_subscribers():
+    return query_all(SELECT_ACTIVE_SUBSCRIBERS)
+
+def chats_with_tier(tier):
+    return [row[0] for row in query_all(SELECT_CHATS_BY_TIER, (tier,))]
+
+def find_referrer(referral_code):
+    result = query_one(SELECT_REFERRER_BY_CODE, (referral_code,))
+    return result[0] if result else None
+
+# Trades
+def record_trade(chat_id, total_pnl, trade, user_pnl):
+    user_cache.update(chat_id, pnl=total_pnl)
+    execute_many([
+        (UPDATE_USER_PNL, (total_pnl, chat_id)),
+        (INSERT_TRADE, (chat_id, trade['entry_time'].isoformat(), trade['entry_price'],
+                        trade['exit_time'].isoformat(), trade['exit_price'], trade['side'], trade['size_sol'], user_pnl)),
+    ])
+
+def trade_stats(chat_id):
+    trade_count, total_pnl, wins, losses = query_one(SELECT_TRADE_STATS, (chat_id,))
+    return {"total_pnl": total_pnl, "trade_count": trade_count, "wins": wins, "losses": losses}
+
+def recent_trades(chat_id, limit=5):
+    return query_all(SELECT_RECENT_TRADES, (chat_id, limit))
+
+# Referrals
+def add_referral_row(referrer_id, referee_id):
+    execute_many([
+        (INSERT_REFERRAL, (referrer_id, referee_id, datetime.now(TIMEZONE).isoformat())),
+        (REFRESH_VALID_REFERRALS, (referee_id,)),
+    ])
+
+def record_referral_profit(referee_id, profit, trade_time):
+    # Credits the referee's referrers and rolls the profit into their monthly and lifetime totals
+    execute_many([
+        (INSERT_REFERRAL_PROFIT, (trade_time, profit, referee_id)),
+        (ADD_MONTHLY_REFERRAL_PROFIT, (trade_time[:7], profit, referee_id)),
+        (ADD_TOTAL_REFERRAL_PROFIT, (profit, referee_id)),
+    ])
+
+def referral_stats(chat_id):
+    result = query_one(SELECT_REFERRAL_STATS, (chat_id,))
+    return (result[0], result[1] or 0.0) if result else (0, 0.0)
+
+def unpaid_referral_months(before_month):
+    return query_all(SELECT_UNPAID_REFERRAL_MONTHS, (before_month,))
+
+def mark_referral_month_paid(referrer_id, month):
+    execute(MARK_REFERRAL_MONTH_PAID, (referrer_id, month))
@@ -0,0 +1,48 @@
+import math
+
+# Strategy Parameters
+leverage = 5
+instId = "SOL-USDT-SWAP"
+lot_size = 0.1
+SLIPPAGE = 0.002
+FEES = 0.00075
+stop_loss_pct = 0.025
+trailing_stop_factor = 1.8
+ema_short_period = 5
+ema_mid_period = 20
+ema_long_period = 100
+atr_period = 14
+
+# Sample Trades (Top 5 by PnL)
+SAMPLE_TRADES = [
+    {"entry_time": "2025-03-10 18:00:00", "side": "short", "entry_price": 126.70, "exit_price": 124.40, "pnl": 31.60},
+    {"entry_time": "2025-03-11 04:30:00", "side": "short", "entry_price": 127.20, "exit_price": 124.90, "pnl": 31.45},
+    {"entry_time": "2025-03-10 15:30:00", "side": "short", "entry_price": 128.30, "exit_price": 126.00, "pnl": 31.10},
+    {"entry_time": "2025-03-11 14:00:00", "side": "short", "entry_price": 128.50, "exit_price": 126.20, "pnl": 31.00},
+    {"entry_time": "2025-03-10 09:15:00", "side": "short", "entry_price": 128.80, "exit_price": 126.50, "pnl": 30.95}
+]
+
+# Shared by live trading and the backtester. Works on floats and NumPy arrays alike.
+def trade_pnl(entry_price, exit_price, size, direction):
+    # direction: 1 for long, -1 for short; returns leveraged PnL after fees and slippage
+    entry_value = entry_price * size
+    exit_value = exit_price * size
+    fees = (entry_value + exit_value) * FEES
+    slippage_cost = entry_value * SLIPPAGE * 2
+    pnl_raw = (exit_price - entry_price) * size * direction
+    return (pnl_raw - fees - slippage_cost) * leverage
+
+def ema_trend(ema_short, ema_mid, ema_long):
+    # 1 when EMAs are stacked bullish, -1 when stacked bearish, 0 otherwise (NaN compares False)
+    return 1 * ((ema_short > ema_mid) & (ema_mid > ema_long)) - 1 * ((ema_short < ema_mid) & (ema_mid < ema_long))
+
+def order_size(trade_size, price):
+    # Position size in SOL for a USDT trade size, rounded down to the lot size
+    return round(math.floor(trade_size / price / lot_size + 1e-9) * lot_size, 8)
+
+def stop_price(entry_price, direction, pct=None):
+    return entry_price * (1 - (stop_loss_pct if pct is None else pct) * direction)
+
+def trailing_stop_price(extreme_price, entry_atr, direction, factor=None):
+    # extreme_price: highest price since entry for longs, lowest for shorts
+    return extreme_price - (trailing_stop_factor if factor is None else factor) * entry_atr * direction
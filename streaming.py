@@ -0,0 +1,195 @@
+import asyncio
+import json
+import logging
+import random
+import websockets
+from http_client import fetch_with_retries_async
+
+# OKX WebSocket endpoints (candles moved to the business endpoint in 2023)
+OKX_WS_PUBLIC = "wss://ws.okx.com:8443/ws/v5/public"
+OKX_WS_BUSINESS = "wss://ws.okx.com:8443/ws/v5/business"
+PING_INTERVAL = 25
+RECONNECT_BASE_DELAY = 1
+RECONNECT_MAX_DELAY = 30
+# REST backfill pages back through at most this many 100-candle pages (OKX's candles endpoint keeps ~1440);
+# a longer outage leaves a gap that subscribers have to reseed across
+BACKFILL_PAGES = 14
+
+class MarketStream:
+    def __init__(self, inst_id, bars=('4H', '15m'), backfill=None, public_url=OKX_WS_PUBLIC,
+                 business_url=OKX_WS_BUSINESS, ping_interval=PING_INTERVAL):
+        self.inst_id = inst_id
+        self.bars = list(bars)
+        self.backfill = backfill
+        self.public_url = public_url
+        self.business_url = business_url
+        self.ping_interval = ping_interval
+        self.last_confirmed = {}
+        self.last_ticker = None
+        self.live_candles = {}
+        self.candle_callbacks = []
+        self.ticker_callbacks = []
+        self.connected = {}
+        self._stopping = False
+        self._candles = None
+        self._ticker_ready = None
+
+    def on_candle(self, callback):
+        self.candle_callbacks.append(callback)
+        return callback
+
+    def on_ticker(self, callback):
+        self.ticker_callbacks.append(callback)
+        return callback
+
+    def seed(self, bar, last_ts):
+        # Resume point, usually the last candle loaded over REST
+        self.last_confirmed[bar] = last_ts
+
+    async def run(self):
+        self._stopping = False
+        # Callbacks run in their own tasks, so the receive loops never wait on the trading I/O behind them and
+        # keep answering pings: candles go through a queue (in order, each once), tickers are coalesced to the latest
+        self._candles = asyncio.Queue()
+        self._ticker_ready = asyncio.Event()
+        dispatchers = [asyncio.create_task(self._dispatch_candles()), asyncio.create_task(self._dispatch_tickers())]
+        candle_args = [{"channel": f"candle{bar}", "instId": self.inst_id} for bar in self.bars]
+        ticker_args = [{"channel": "tickers", "instId": self.inst_id}]
+        try:
+            await asyncio.gather(
+                self._run_channel(self.business_url, candle_args, backfill=True),
+                self._run_channel(self.public_url, ticker_args),
+            )
+        finally:
+            for task in dispatchers:
+                task.cancel()
+            await asyncio.gather(*dispatchers, return_exceptions=True)
+
+    def stop(self):
+        self._stopping = True
+
+    async def _run_channel(self, url, args, backfill=False):
+        attempt = 0
+        while not self._stopping:
+            try:
+                async with websockets.connect(url, ping_interval=None, close_timeout=2) as ws:
+                    await ws.send(json.dumps({"op": "subscribe", "args": args}))
+                    self.connected[url] = True
+                    attempt = 0
+                    logging.info(f"Stream connected to {url} ({', '.join(arg['channel'] for arg in args)})")
+                    if backfill:
+                        await self._backfill_gaps()
+                    await self._recv_loop(ws)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Stream error on {url}: {str(e)}")
+            finally:
+                self.connected[url] = False
+            if self._stopping:
+                break
+            delay = min(RECONNECT_MAX_DELAY, RECONNECT_BASE_DELAY * 2 ** attempt) * random.uniform(0.5, 1)
+            attempt += 1
+            logging.info(f"Stream reconnecting to {url} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    async def _recv_loop(self, ws):
+        awaiting_pong = False
+        while not self._stopping:
+            try:
+                raw = await asyncio.wait_for(ws.recv(), timeout=self.ping_interval)
+            except asyncio.TimeoutError:
+                if awaiting_pong:
+                    raise ConnectionError("No pong from server")
+                await ws.send("ping")
+                awaiting_pong = True
+                continue
+            awaiting_pong = False
+            if raw == "pong":
+                continue
+            await self._handle(json.loads(raw))
+
+    async def _handle(self, message):
+        if message.get("event") == "error":
+            logging.error(f"Stream subscription error: {message.get('msg')}")
+            return
+        if "data" not in message:
+            return
+        channel = message["arg"]["channel"]
+        if channel == "tickers" and message["data"]:
+            self.last_ticker = message["data"][-1]
+            self._ticker_ready.set()
+        elif channel.startswith("candle"):
+            bar = channel[len("candle"):]
+            for row in message["data"]:
+                if row[8] == '1':
+                    self._publish(bar, row)
+                else:
+                    self.live_candles[bar] = row
+
+    def _publish(self, bar, row):
+        # Confirmed candles only, in order, each exactly once
+        ts = int(row[0])
+        last = self.last_confirmed.get(bar)
+        if last is not None and ts <= last:
+            return
+        self.last_confirmed[bar] = ts
+        self._candles.put_nowait((bar, row))
+
+    async def _dispatch_candles(self):
+        while True:
+            bar, row = await self._candles.get()
+            for callback in self.candle_callbacks:
+                try:
+                    await callback(self.inst_id, bar, row)
+                except Exception as e:
+                    logging.error(f"Candle callback failed for {self.inst_id} {bar}: {str(e)}")
+
+    async def _dispatch_tickers(self):
+        # A tick that arrives while the callbacks run replaces any older unhandled one: exits are checked
+        # against the latest price, not a backlog of stale ones
+        while True:
+            await self._ticker_ready.wait()
+            self._ticker_ready.clear()
+            ticker = self.last_ticker
+            for callback in self.ticker_callbacks:
+                try:
+                    await callback(self.inst_id, ticker)
+                except Exception as e:
+                    logging.error(f"Ticker callback failed for {self.inst_id}: {str(e)}")
+
+    async def _backfill_gaps(self):
+        if not self.backfill:
+            return
+        for bar in self.bars:
+            last = self.last_confirmed.get(bar)
+            if last is None:
+                continue
+            try:
+                rows = await self.backfill(self.inst_id, bar, last)
+            except Exception as e:
+                logging.error(f"Backfill failed for {self.inst_id} {bar}: {str(e)}")
+                continue
+            rows = sorted((row for row in rows or [] if row[8] == '1'), key=lambda row: int(row[0]))
+            if rows:
+                logging.info(f"Backfilled {len(rows)} {bar} candles for {self.inst_id}")
+            for row in rows:
+                self._publish(bar, row)
+
+def rest_backfill(okx_client):
+    # Candles newer than `after_ts` over REST, paging back from the newest (OKX returns the latest 100 per call)
+    async def backfill(inst_id, bar, after_ts):
+        rows = []
+        cursor = ''
+        for _ in range(BACKFILL_PAGES):
+            response = await fetch_with_retries_async(
+                lambda: okx_client.get_candlesticks(instId=inst_id, bar=bar, after=cursor, before=str(after_ts), limit='100'))
+            if not response:
+                break
+            page = response['data']
+            rows.extend(page)
+            if len(page) < 100:
+                break
+            cursor = page[-1][0]
+        return rows
+    return backfill
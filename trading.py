@@ -0,0 +1,508 @@
+import asyncio
+import logging
+import math
+import re
+import time
+from datetime import datetime
+import pytz
+import storage
+from storage import get_user
+import numpy as np
+from indicators import IndicatorEngine
+from candles import CandleBuffer, parse_rows
+from candle_store import CandleStore, BASE_BAR, as_block, from_block, bar_ms
+from strategy import instId, ema_short_period, ema_mid_period, ema_long_period, trade_pnl
+from streaming import MarketStream, rest_backfill
+from http_client import OkxAsyncClient, fetch_with_retries_async
+from executor import ExecutionEngine
+from position_monitor import PositionMonitor
+from scheduler import SignalScheduler
+from shards import shard_of
+from journal import StateJournal, journal_names
+import metrics
+
+# Constants
+TIMEZONE = pytz.timezone('Asia/Singapore')
+REFERRAL_SHARE = 0.01
+STREAM_BARS = ['4H', '15m']
+# Order sizing (lot size, contract value) is specific to the strategy instrument; other instruments are signal-only
+TRADED_INSTRUMENTS = {instId}
+# Seconds between state snapshots (the journal is only appended to in between)
+SNAPSHOT_INTERVAL = 300
+# Poll mode: seconds between ticker fetches that drive the exit checks (stream mode gets every tick pushed)
+TICKER_POLL_INTERVAL = 5
+# A failed exit is re-armed after CLOSE_RETRY_BASE * 2^(failures - 1) seconds, at most CLOSE_RETRY_MAX
+CLOSE_RETRY_BASE = 5
+CLOSE_RETRY_MAX = 300
+# OKX rejects a reduce-only order with this when there is no position left to close
+NO_POSITION_CODES = {"51169"}
+
+# Global State
+position_states = {}
+entry_atrs = {}
+trades = {}
+trackers = {}
+custom_tps = {}
+trading_active = {}
+okx_client = OkxAsyncClient(flag='0')
+execution_engine = ExecutionEngine(instId, flag='0')
+position_monitor = PositionMonitor()
+market_stream = None
+candle_store = CandleStore()
+signal_scheduler = None
+broadcaster = None
+latest_prices = {}
+# chat_id -> consecutive failed exit orders
+close_failures = {}
+metrics.gauge("open_positions", "Positions tracked by the exit monitor", lambda: len(position_monitor))
+latest_trade = {"time": None, "side": None, "entry_price": None, "exit_price": None, "pnl": None}
+latest_trade_listeners = []
+# (shard, shard count) of this process in sharded mode; it only trades for and messages the chats it owns
+shard = (0, 1)
+
+def owns(chat_id):
+    return shard[1] == 1 or shard_of(chat_id, shard[1]) == shard[0]
+
+# State journal: position_states, entry_atrs, trades, trackers, custom_tps and trading_active survive restarts
+state_journal = None
+
+def _journal(table, chat_id, value=None, delete=False):
+    if state_journal is not None:
+        state_journal.record(table, chat_id, value, delete)
+
+# Utility Functions
+async def send_telegram_alert(chat_id, message, reply_markup=None):
+    # Queued on the broadcaster; delivery is rate limited and retried there
+    broadcaster.send(chat_id, message, reply_markup=reply_markup)
+
+async def pin_latest_trade(chat_id):
+    if latest_trade["time"]:
+        trade_msg = (
+            f"📌 *Latest Trade (Pinned)*\n"
+            f"Time: {latest_trade['time'].strftime('%Y-%m-%d %H:%M')}\n"
+            f"Side: {latest_trade['side'].capitalize()}\n"
+            f"Entry: {latest_trade['entry_price']:.2f} USDT | Exit: {latest_trade['exit_price']:.2f} USDT\n"
+            f"PnL: {latest_trade['pnl']:.2f} USDT"
+        )
+        broadcaster.send(chat_id, trade_msg, pin=True)
+
+# Trading Logic
+class TradeTracker:
+    def __init__(self, total_pnl=0, trade_count=0, wins=0, losses=0):
+        self.total_pnl = total_pnl
+        self.trade_count = trade_count
+        self.wins = wins
+        self.losses = losses
+
+    async def update(self, trade, chat_id):
+        profit_cut = get_user(chat_id).profit_cut
+        pnl = trade_pnl(trade['entry_price'], trade['exit_price'], trade['size_sol'], 1 if trade['side'] == 'long' else -1)
+        user_pnl = pnl * (1 - profit_cut)
+        self.total_pnl += user_pnl
+        self.trade_count += 1
+        self.wins += 1 if user_pnl > 0 else 0
+        self.losses += 1 if user_pnl < 0 else 0
+        _journal("trackers", chat_id, vars(self))
+        storage.record_trade(chat_id, self.total_pnl, trade, user_pnl)
+        if user_pnl > 0:
+            storage.record_referral_profit(chat_id, user_pnl * REFERRAL_SHARE, trade['exit_time'].isoformat())
+        latest_trade.update({
+            "time": trade['exit_time'],
+            "side": trade['side'],
+            "entry_price": trade['entry_price'],
+            "exit_price": trade['exit_price'],
+            "pnl": user_pnl
+        })
+        for listener in latest_trade_listeners:
+            listener(latest_trade)
+        await send_telegram_alert(chat_id, 
+            f"🏆 *VIP Win!* {trade['exit_type']} at {trade['exit_price']:.2f}! You made {user_pnl:.2f} USDT (Cut: {pnl * profit_cut:.2f})")
+        await pin_latest_trade(chat_id)
+
+def tracker_for(chat_id):
+    # Trackers the journal does not know (trades from before it existed) are rebuilt once from the trades table
+    tracker = trackers.get(chat_id)
+    if tracker is None:
+        tracker = trackers[chat_id] = TradeTracker(**storage.trade_stats(chat_id))
+        if tracker.trade_count:
+            _journal("trackers", chat_id, vars(tracker))
+    return tracker
+
+def set_trading_active(chat_id, active):
+    trading_active[chat_id] = active
+    _journal("trading_active", chat_id, active)
+
+def custom_tp_error(chat_id, tp):
+    # Why tp cannot be the chat's take-profit, else None. Against an open position it must lie on the profit side
+    # of the entry and not be crossed yet; while flat it is checked against the next entry (PositionMonitor.add)
+    if tp is None:
+        return None
+    if not math.isfinite(tp) or tp <= 0:
+        return "it is not a price"
+    trade = trades.get(chat_id) if position_states.get(chat_id) in ("long", "short") else None
+    if trade is None:
+        return None
+    direction = 1 if trade["side"] == "long" else -1
+    if (tp - trade["entry_price"]) * direction <= 0:
+        return f"it must be {'above' if direction == 1 else 'below'} your {trade['side']} entry at {trade['entry_price']:.2f} USDT"
+    price = latest_prices.get(instId)
+    if price is not None and (price - tp) * direction >= 0:
+        return f"the price ({price:.2f} USDT) is already past it"
+    return None
+
+def set_custom_tp(chat_id, tp):
+    if tp is None:
+        custom_tps.pop(chat_id, None)
+        _journal("custom_tps", chat_id, delete=True)
+    else:
+        custom_tps[chat_id] = tp
+        _journal("custom_tps", chat_id, tp)
+    position_monitor.set_tp(chat_id, tp)
+
+INCREMENTAL_LIMIT = '10'
+indicator_state = {}
+
+def _seed_state(inst_id, timeframe, data, limit):
+    confirmed = [row for row in data if row[8] == '1']
+    return _seed_block(inst_id, timeframe, parse_rows(confirmed), limit), data[len(confirmed):]
+
+def _seed_block(inst_id, timeframe, prices, limit):
+    # prices: rows x OHLCV, oldest first
+    engine = IndicatorEngine((ema_short_period, ema_mid_period, ema_long_period))
+    with metrics.indicator_seconds.time(stage="seed"):
+        values = engine.seed(zip(prices[:, 0].astype(np.int64).tolist(), prices[:, 2].tolist(),
+                                 prices[:, 3].tolist(), prices[:, 4].tolist()))
+    candles = CandleBuffer(int(limit), engine.columns)
+    candles.extend(np.hstack((prices, np.array([list(row.values()) for row in values]).reshape(-1, len(engine.columns)))))
+    state = {"engine": engine, "candles": candles}
+    indicator_state[(inst_id, timeframe)] = state
+    return state
+
+def _seed_stored(inst_id, timeframe, limit):
+    # Seeds from the local candle store when it holds the full window, otherwise None. The window matches a
+    # REST seed of `limit` rows, whose newest row is the in-progress candle, so indicator values are identical
+    if CandleStore.source_bar(timeframe) != BASE_BAR:
+        return None
+    columns = candle_store.tail(inst_id, timeframe, int(limit) - 1)
+    if len(columns["ts"]) < int(limit) - 1:
+        return None
+    return _seed_block(inst_id, timeframe, as_block(columns), limit)
+
+async def _seed_from_store(inst_id, timeframe, limit):
+    # Warm start: bring the stored 15m history up to date (usually one short backfill), then seed without
+    # downloading the full window; the incremental fetch that follows catches anything newer
+    if CandleStore.source_bar(timeframe) != BASE_BAR:
+        return None
+    await candle_store.sync(okx_client, inst_id)
+    return _seed_stored(inst_id, timeframe, limit)
+
+async def _record_candles(inst_id, timeframe, rows):
+    # Keeps the stored 15m history current from candles already fetched; a gap is backfilled over REST
+    confirmed = [row for row in rows if row[8] == '1']
+    if timeframe == BASE_BAR and confirmed and not candle_store.record(inst_id, timeframe, from_block(parse_rows(confirmed))):
+        await candle_store.sync(okx_client, inst_id)
+
+# Order Execution
+async def open_positions(side, price, atr):
+    signal_id = datetime.now(TIMEZONE).strftime('%Y%m%d%H%M%S')
+    users = [user for user in storage.active_subscribers()
+             if owns(user[0]) and trading_active.get(user[0]) and position_states.get(user[0]) not in ["long", "short", "closing"]]
+    results = await execution_engine.open_positions(users, side, price, signal_id)
+    entry_time = datetime.now(TIMEZONE)
+    for result in results:
+        if not result["ok"]:
+            await send_telegram_alert(result["chat_id"], f"⚠️ Could not open {side} position: {result['error']}")
+            continue
+        chat_id = result["chat_id"]
+        # The fill's average price; the signal price only when OKX accepted the order but its fill could not be read
+        entry_price = result["fill_price"] or price
+        position_states[chat_id] = side
+        entry_atrs[chat_id] = atr
+        trades[chat_id] = {"entry_time": entry_time, "entry_price": entry_price, "side": side, "size_sol": result["size_sol"]}
+        _journal("position_states", chat_id, side)
+        _journal("entry_atrs", chat_id, atr)
+        _journal("trades", chat_id, trades[chat_id])
+        position_monitor.add(chat_id, side, entry_price, atr, custom_tps.get(chat_id))
+        await send_telegram_alert(chat_id, f"🐶 *New {side.capitalize()}!* Entered at {entry_price:.2f} ({result['size_sol']} SOL)")
+    return results
+
+async def close_positions(chat_ids, price, exit_type):
+    signal_id = datetime.now(TIMEZONE).strftime('%Y%m%d%H%M%S') + "x"
+    positions = []
+    credentials = {}
+    for chat_id in chat_ids:
+        if position_states.get(chat_id) not in ["long", "short"]:
+            position_monitor.remove(chat_id)
+            continue
+        trade = trades[chat_id]
+        user = get_user(chat_id)
+        credentials[chat_id] = (user.api_key, user.api_secret, user.api_pass)
+        position_states[chat_id] = "closing"
+        _journal("position_states", chat_id, "closing")
+        if "close_id" not in trade:
+            # One exit order id per position, journaled and reused by every retry: a close whose answer was lost
+            # is found again by it instead of being sent a second time
+            trade["close_id"] = signal_id
+            _journal("trades", chat_id, trade)
+        positions.append((chat_id, trade['side'], trade['size_sol'], *credentials[chat_id], trade["close_id"]))
+    results = await execution_engine.close_positions(positions, signal_id)
+    exit_time = datetime.now(TIMEZONE)
+    updates = []
+    for result in results:
+        chat_id = result["chat_id"]
+        if not result["ok"] and result["code"] in NO_POSITION_CODES:
+            # Closed on OKX already: by an earlier attempt of this exit whose answer was lost (book its fill),
+            # or by hand or liquidation (nothing left to manage, and no fill to book)
+            fill = await execution_engine.find_fill(chat_id, credentials[chat_id], trades[chat_id]["close_id"])
+            if fill is None:
+                _drop_position(chat_id)
+                await send_telegram_alert(chat_id, "⚠️ Your position is no longer open on OKX; GoodBoyTrader stopped managing it.")
+                continue
+            result = {**result, "ok": True, "fill_price": fill[1], "code": None, "error": None}
+        if not result["ok"]:
+            if result["ord_id"] is not None:
+                # That order exists on OKX and ended without a fill, so its id cannot be sent again
+                trades[chat_id].pop("close_id")
+                _journal("trades", chat_id, trades[chat_id])
+            await _retry_close(chat_id, result["error"])
+            continue
+        trade = {**trades[chat_id], "exit_time": exit_time, "exit_price": result["fill_price"] or price, "exit_type": exit_type}
+        _drop_position(chat_id)
+        updates.append(tracker_for(chat_id).update(trade, chat_id))
+    await asyncio.gather(*updates)
+    return results
+
+def _drop_position(chat_id):
+    trades.pop(chat_id, None)
+    position_states.pop(chat_id, None)
+    entry_atrs.pop(chat_id, None)
+    close_failures.pop(chat_id, None)
+    for table in ("trades", "position_states", "entry_atrs"):
+        _journal(table, chat_id, delete=True)
+    position_monitor.remove(chat_id)
+
+async def _retry_close(chat_id, error):
+    # The exit stays disarmed for a backoff period, so a rejected close is not resent on every tick;
+    # the user hears about it once per failed exit, not once per attempt
+    failures = close_failures[chat_id] = close_failures.get(chat_id, 0) + 1
+    position_states[chat_id] = trades[chat_id]['side']
+    _journal("position_states", chat_id, position_states[chat_id])
+    delay = min(CLOSE_RETRY_MAX, CLOSE_RETRY_BASE * 2 ** (failures - 1))
+    logging.error(f"Close for {chat_id} failed ({failures} in a row): {error}; retrying in {delay} s")
+    asyncio.get_running_loop().call_later(delay, _rearm_exit, chat_id)
+    if failures == 1:
+        await send_telegram_alert(chat_id, f"⚠️ Could not close position: {error}. Retrying automatically.")
+
+def _rearm_exit(chat_id):
+    if position_states.get(chat_id) in ["long", "short"]:
+        position_monitor.resume(chat_id)
+
+async def check_exits(price):
+    # One vectorized pass over every open position; exits are closed in one fan-out per exit type
+    exits = {}
+    with metrics.indicator_seconds.time(stage="exit_check"):
+        events = position_monitor.tick(price)
+    for chat_id, exit_type, exit_price in events:
+        exits.setdefault(exit_type, []).append(chat_id)
+    for exit_type, chat_ids in exits.items():
+        await close_positions(chat_ids, price, exit_type)
+
+def _needs_reseed(state, data):
+    # Gap larger than the incremental window (or nothing back): reseed from full history
+    engine = state["engine"]
+    return not data or engine.last_ts is None or int(data[0][0]) > engine.last_ts
+
+def apply_confirmed_candles(timeframe, rows, inst_id=instId):
+    state = indicator_state.get((inst_id, timeframe))
+    engine = state["engine"]
+    new_rows = [row for row in rows if row[8] == '1' and int(row[0]) > engine.last_ts]
+    if new_rows:
+        with metrics.indicator_seconds.time(stage="update"):
+            for candle in parse_rows(new_rows).tolist():
+                values = engine.update(int(candle[0]), candle[2], candle[3], candle[4])
+                state["candles"].append(candle + list(values.values()))
+
+async def refresh_market_data(inst_id, timeframe, limit='400'):
+    # Async source for the signal scheduler: one shared fetch per instrument and bar, whoever is trading it.
+    # Returns (last confirmed ts, indicator values, last confirmed close)
+    state = indicator_state.get((inst_id, timeframe))
+    streamed = market_stream is not None and market_stream.inst_id == inst_id and timeframe in market_stream.bars
+    if state is None:
+        state = await _seed_from_store(inst_id, timeframe, limit)
+    if state is None or not streamed:
+        if state is not None:
+            response = await fetch_with_retries_async(
+                lambda: okx_client.get_candlesticks(inst_id, bar=timeframe, limit=INCREMENTAL_LIMIT))
+            if not response:
+                return None
+            data = response['data'][::-1]
+            if _needs_reseed(state, data):
+                state = None
+            else:
+                apply_confirmed_candles(timeframe, data, inst_id)
+                await _record_candles(inst_id, timeframe, data)
+        if state is None:
+            response = await fetch_with_retries_async(lambda: okx_client.get_candlesticks(inst_id, bar=timeframe, limit=limit))
+            if not response:
+                return None
+            state, _ = _seed_state(inst_id, timeframe, response['data'][::-1], limit)
+            await _record_candles(inst_id, timeframe, response['data'][::-1])
+    engine = state["engine"]
+    return engine.last_ts, engine.current(), engine.last_close
+
+async def on_signal(inst_id, side, price, atr):
+    # Entries for the traded instrument; every signal also goes out to Elite members as a signal update
+    logging.info(f"Signal {inst_id}: {side} at {price} (ATR {atr:.4f})")
+    for chat_id in filter(owns, storage.chats_with_tier("elite")):
+        await send_telegram_alert(chat_id, f"📡 *{inst_id}*: EMA {side} signal at {price:.4f} (ATR {atr:.4f})")
+    if inst_id in TRADED_INSTRUMENTS:
+        await open_positions(side, price, atr)
+
+async def on_stream_candle(inst_id, bar, row):
+    state = indicator_state.get((inst_id, bar))
+    if state is not None:
+        last = state["engine"].last_ts
+        if last is not None and int(row[0]) > last + bar_ms(bar):
+            # Candles went missing (an outage longer than the stream's backfill): reseed rather than
+            # updating the indicators straight across the gap
+            logging.warning(f"Stream gap in {inst_id} {bar} after {last}, reseeding")
+            indicator_state.pop((inst_id, bar), None)
+            await refresh_market_data(inst_id, bar)
+        if (inst_id, bar) in indicator_state:
+            apply_confirmed_candles(bar, [row], inst_id)
+    await _record_candles(inst_id, bar, [row])
+
+async def on_stream_ticker(inst_id, ticker):
+    latest_prices[inst_id] = float(ticker['last'])
+    if inst_id == instId:
+        await check_exits(latest_prices[inst_id])
+
+async def poll_ticker(context):
+    # Poll mode's ticker source: exits are checked on the last traded price every TICKER_POLL_INTERVAL.
+    # job data may replace the callback (the sharded publisher forwards the tick to the workers)
+    on_ticker = (context.job.data or {}).get("on_ticker", on_stream_ticker) if context.job else on_stream_ticker
+    if on_ticker is on_stream_ticker and not len(position_monitor):
+        return
+    response = await fetch_with_retries_async(lambda: okx_client.get_ticker(instId), max_attempts=1)
+    if response:
+        await on_ticker(instId, response['data'][0])
+
+async def run_market_stream(context):
+    # job data may replace the ticker callback (the sharded publisher forwards ticks instead of checking exits)
+    global market_stream
+    on_ticker = (context.job.data or {}).get("on_ticker", on_stream_ticker) if context.job else on_stream_ticker
+    stream = MarketStream(instId, bars=STREAM_BARS, backfill=rest_backfill(okx_client))
+    for bar in STREAM_BARS:
+        # On the event loop like the scheduler's refresh of the same bars, so a candle cannot be applied twice
+        await refresh_market_data(instId, bar)
+        state = indicator_state.get((instId, bar))
+        if state and state["engine"].last_ts is not None:
+            stream.seed(bar, state["engine"].last_ts)
+    stream.on_candle(on_stream_candle)
+    stream.on_ticker(on_ticker)
+    market_stream = stream
+    await stream.run()
+
+async def run_signal_scheduler(context):
+    global signal_scheduler
+    signal_scheduler = SignalScheduler(refresh_market_data)
+    signal_scheduler.on_signal((context.job.data or {}).get("on_signal", on_signal) if context.job else on_signal)
+    await signal_scheduler.run()
+
+# State recovery
+def journal_name(layout=None):
+    index, count = layout or shard
+    return "state" if count == 1 else f"shard-{index}-of-{count}"
+
+def _layout_count(name):
+    # Shard count of the layout a journal belongs to; None for anything else in the directory
+    if name == "state":
+        return 1
+    match = re.fullmatch(r"shard-\d+-of-(\d+)", name)
+    return int(match.group(1)) if match else None
+
+def _other_layouts(directory):
+    # {shard count: [journals]} of every layout but this process's
+    layouts = {}
+    for name in journal_names(directory):
+        count = _layout_count(name)
+        if count is not None and count != shard[1]:
+            layouts.setdefault(count, []).append(StateJournal(name, directory))
+    return layouts
+
+def _previous_layout(directory):
+    # Journals of the layout written last: together they hold every chat's latest state, while an older
+    # layout may still list positions that were closed since
+    layouts = _other_layouts(directory)
+    if not layouts:
+        return []
+    return max(layouts.values(), key=lambda journals: max(journal.last_written() for journal in journals))
+
+def _retire_other_layouts(directory):
+    # Only once every shard of this layout has its own files, i.e. has taken its chats from the old one
+    if not all(StateJournal(journal_name((index, shard[1])), directory).exists() for index in range(shard[1])):
+        return
+    for count, journals in _other_layouts(directory).items():
+        for journal in journals:
+            journal.retire()
+        logging.info(f"Retired the {count}-shard state layout")
+
+def state_tables():
+    # Plain copies for a snapshot; trailing extremes move on every tick, so they are snapshotted, not journaled
+    return {
+        "position_states": dict(position_states),
+        "entry_atrs": dict(entry_atrs),
+        "trades": {chat_id: dict(trade) for chat_id, trade in trades.items()},
+        "trackers": {chat_id: dict(vars(tracker)) for chat_id, tracker in trackers.items() if tracker.trade_count},
+        "custom_tps": dict(custom_tps),
+        "trading_active": dict(trading_active),
+        "extremes": {chat_id: float(position_monitor.extreme[slot]) for chat_id, slot in position_monitor.slots.items()},
+    }
+
+def recover_state(directory=None):
+    # Rebuilds the state dicts in place (handlers hold references to them) and re-arms exits for open positions
+    global state_journal
+    started = time.perf_counter()
+    journal = StateJournal(journal_name(), *([directory] if directory else []))
+    # Nothing under this shard layout yet (first start, or the shard count changed): take owned chats from the
+    # layout in use before
+    sources = [journal] if journal.exists() else _previous_layout(journal.directory)
+    if sources and sources[0] is not journal:
+        logging.info(f"Migrating owned chats from {', '.join(source.name for source in sources)}")
+    extremes = {}
+    for tables in [source.recover() for source in sources]:
+        for name, target in (("position_states", position_states), ("entry_atrs", entry_atrs), ("trades", trades),
+                             ("custom_tps", custom_tps), ("trading_active", trading_active), ("extremes", extremes)):
+            target.update((chat_id, value) for chat_id, value in tables.get(name, {}).items() if owns(chat_id))
+        trackers.update((chat_id, TradeTracker(**value)) for chat_id, value in tables.get("trackers", {}).items() if owns(chat_id))
+    for chat_id, state in list(position_states.items()):
+        trade = trades.get(chat_id)
+        if trade is None or chat_id not in entry_atrs:
+            logging.error(f"Dropping incomplete recovered position for {chat_id}")
+            position_states.pop(chat_id)
+            continue
+        if state == "closing":
+            # The exit order's outcome is unknown; re-arm the exits as a failed close would
+            logging.warning(f"Position for {chat_id} was closing at shutdown; re-arming its exits")
+            position_states[chat_id] = trade["side"]
+        position_monitor.add(chat_id, trade["side"], trade["entry_price"], entry_atrs[chat_id], custom_tps.get(chat_id),
+                             extremes.get(chat_id))
+    replayed = sum(source.records for source in sources)
+    state_journal = journal.open()
+    # Start from a fresh snapshot so this layout's files hold everything recovered; other layouts are retired
+    # only once it is on disk
+    state_journal.snapshot(state_tables(), wait=True)
+    _retire_other_layouts(journal.directory)
+    logging.info(f"Recovered state in {(time.perf_counter() - started) * 1000:.1f} ms: {len(position_monitor)} open positions, "
+                 f"{len(trackers)} trackers, {replayed} journal records replayed")
+
+async def compact_state(context):
+    if state_journal is not None and state_journal.records:
+        state_journal.snapshot(state_tables())
+
+def close_state():
+    global state_journal
+    if state_journal is not None:
+        state_journal.snapshot(state_tables(), wait=True)
+        state_journal.close()
+        state_journal = None
@@ -0,0 +1,86 @@
+from collections import OrderedDict
+import threading
+
+USER_FIELDS = ("chat_id", "tier", "trade_size", "pnl", "profit_cut", "signup_date", "sub_expiry", "api_key",
+               "api_secret", "api_pass", "referral_code", "referred_by", "referral_reward_claimed", "wallet")
+DEFAULT_CAPACITY = 10000
+
+class UserRecord:
+    __slots__ = USER_FIELDS
+
+    def __init__(self, *values):
+        for field, value in zip(USER_FIELDS, values):
+            setattr(self, field, value)
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(*row)
+
+    def to_row(self):
+        return tuple(getattr(self, field) for field in USER_FIELDS)
+
+    # Row compatibility: records still index and unpack like the old 14-tuple
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.to_row()[index]
+        return getattr(self, USER_FIELDS[index])
+
+    def __iter__(self):
+        return iter(self.to_row())
+
+    def __len__(self):
+        return len(USER_FIELDS)
+
+    def __eq__(self, other):
+        return tuple(self) == tuple(other)
+
+    def __repr__(self):
+        return f"UserRecord(chat_id={self.chat_id!r}, tier={self.tier!r})"
+
+class UserCache:
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._records = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, chat_id):
+        with self._lock:
+            record = self._records.get(chat_id)
+            if record is None:
+                self.misses += 1
+                return None
+            self._records.move_to_end(chat_id)
+            self.hits += 1
+            return record
+
+    def put(self, record):
+        with self._lock:
+            self._records[record.chat_id] = record
+            self._records.move_to_end(record.chat_id)
+            while len(self._records) > self.capacity:
+                # Least recently used chats are the inactive ones
+                self._records.popitem(last=False)
+                self.evictions += 1
+
+    def update(self, chat_id, **fields):
+        # Patch a cached record in place; uncached users are loaded on their next read
+        with self._lock:
+            record = self._records.get(chat_id)
+            if record is not None:
+                for field, value in fields.items():
+                    setattr(record, field, value)
+
+    def invalidate(self, chat_id=None):
+        with self._lock:
+            if chat_id is None:
+                self._records.clear()
+            else:
+                self._records.pop(chat_id, None)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"size": len(self._records), "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0}